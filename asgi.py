@@ -0,0 +1,81 @@
+"""ASGI serving mode: the same routes as app.py on a single long-lived event loop.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Prisma is connected on the server's loop, so database calls are awaited
+natively; blocking work runs on lecture_api.blocking_pool (API_BLOCKING_WORKERS)
+and lecture generation on its own job workers, as under Flask. On shutdown
+new lectures are refused and queued or running ones get LECTURE_SHUTDOWN_SECONDS
+to finish before Prisma disconnects.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from routes import lecture_api
+from routes.lecture_api import EventStream, PlainText
+from utils.events import SSE_HEADERS, sse
+
+logger = logging.getLogger(__name__)
+
+# How long shutdown waits for queued and running lectures before disconnecting the database.
+LECTURE_SHUTDOWN_SECONDS = float(os.getenv("LECTURE_SHUTDOWN_SECONDS", "300"))
+
+
+async def _sse_frames(stream):
+    async for event in stream:
+        yield sse(event)
+
+
+def to_response(result):
+    body, status = result if isinstance(result, tuple) else (result, 200)
+    if isinstance(body, EventStream):
+        return StreamingResponse(_sse_frames(body), status_code=status, media_type="text/event-stream", headers=SSE_HEADERS)
+    if isinstance(body, PlainText):
+        return Response(body.text, status_code=status, media_type=body.content_type)
+    return JSONResponse(body, status_code=status)
+
+
+async def json_body(request):
+    """The parsed JSON body, or None when it is missing or malformed (as Flask's get_json(force=True, silent=True))."""
+    try:
+        return json.loads(await request.body())
+    except ValueError:
+        return None
+
+
+def endpoint(handler):
+    async def run(request):
+        data = await json_body(request) if request.method == "POST" else None
+        return to_response(await handler(data, **request.path_params))
+
+    return run
+
+
+@asynccontextmanager
+async def lifespan(app):
+    lecture_api.database.attach(asyncio.get_running_loop())
+    await lecture_api.database.connect()
+    yield
+    # Jobs save progress through the database on this loop, so they have to finish before it goes away.
+    if not await asyncio.to_thread(lecture_api.lecture_jobs.drain, LECTURE_SHUTDOWN_SECONDS):
+        logger.warning("Shutting down with %d lecture jobs unfinished", lecture_api.lecture_jobs.queued)
+    await lecture_api.database.disconnect()
+    lecture_api.blocking_pool.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route(re.sub(r"<(\w+)>", r"{\1}", path), endpoint(handler), methods=methods, name=handler.__name__)
+        for path, methods, handler in lecture_api.ROUTES
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["http://localhost:3000", "localhost:7000"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
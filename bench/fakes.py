@@ -0,0 +1,302 @@
+"""Deterministic local stand-ins for Groq, Serper, the web, the embedder and Prisma."""
+import asyncio
+import hashlib
+import random
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, List, Optional, Type
+from uuid import uuid4
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, Field
+from utils.loop import BackgroundLoop
+
+WORDS = (
+    "model data training gradient loss function network layer neuron weight bias optimizer learning rate "
+    "regression classification cluster feature vector matrix tensor probability distribution sample "
+    "variance bias overfitting regularization validation accuracy precision recall kernel margin tree "
+    "forest boosting ensemble embedding attention sequence token transformer encoder decoder label"
+).split()
+
+
+def _rng(*parts):
+    return random.Random(hashlib.sha256("\0".join(map(str, parts)).encode()).hexdigest())
+
+
+def _sentence(rng, words=12):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+class FixtureCorpus:
+    """A fixed set of HTML pages (with nav and cookie-banner boilerplate) served under bench.local URLs."""
+
+    def __init__(self, pages=60, paragraphs=12, seed=0):
+        self.urls = [f"https://bench.local/article-{i}" for i in range(pages)]
+        self.paragraphs = paragraphs
+        self.seed = seed
+
+    def html(self, url):
+        rng = _rng(self.seed, url)
+        body = "\n".join(f"<p>{' '.join(_sentence(rng) for _ in range(6))}</p>" for _ in range(self.paragraphs))
+        return (
+            "<html><head><title>Bench article</title><style>p {margin: 0}</style></head><body>"
+            "<nav><a href='/'>Home</a> <a href='/login'>Log in</a> <a href='/subscribe'>Subscribe</a></nav>"
+            "<div>We use cookies to improve your experience. Accept all</div>"
+            f"<article><h1>{_sentence(rng, 5)}</h1>\n{body}</article>"
+            "<footer>All rights reserved. Privacy policy. Terms of use.</footer></body></html>"
+        )
+
+    def search(self, query, results=5):
+        rng = _rng(self.seed, "search", query.lower())
+        return rng.sample(self.urls, min(results, len(self.urls)))
+
+
+class FakeResponse:
+    def __init__(self, text, status_code=200, content_type="text/html; charset=utf-8"):
+        self.text = text
+        self.status_code = status_code
+        self.headers = {"Content-Type": content_type}
+
+
+class FakeHTTPSession:
+    """Serves the corpus in place of utils.scarper.http_session, after latency seconds."""
+
+    def __init__(self, corpus, latency=0.05):
+        self.corpus = corpus
+        self.latency = latency
+
+    def get(self, url, timeout=None, **kwargs):
+        time.sleep(self.latency)
+        if url not in self.corpus.urls:
+            return FakeResponse("not found", status_code=404)
+        return FakeResponse(self.corpus.html(url))
+
+
+class _SearchArgs(BaseModel):
+    query: str = Field(description="The search query to find relevant information from the web.")
+
+
+class FakeSearchTool(BaseTool):
+    name: str = "Web Search Tool"
+    description: str = "This tool uses the Google Serper API to fetch relevant information from the web based on the provided query."
+    args_schema: Type[BaseModel] = _SearchArgs
+    corpus: Any
+    latency: float = 0.1
+
+    def _run(self, query: str):
+        time.sleep(self.latency)
+        return [{url: f"About {query}"} for url in self.corpus.search(query)]
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers the pipeline's prompts in the shapes the nodes expect, taking latency + tokens / tokens_per_second.
+
+    ReAct prompts get one tool call first and a Final Answer once an Observation is present,
+    so agents make the same number of round trips as a well-behaved real model.
+    """
+
+    latency: float = 0.3
+    tokens_per_second: float = 250.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "bench-fake"
+
+    def _reply(self, prompt):
+        rng = _rng(prompt)
+        # The ReAct template's instructions mention "Observation:" too; only the scratchpad after "Begin!" counts.
+        scratchpad = prompt.rsplit("Begin!", 1)[-1]
+        observed = "Observation:" in scratchpad
+        if "five key subtopics" in prompt:
+            topic = re.search(r"expert on (.+?)\.", prompt).group(1)
+            return "\n".join(f"{topic} part {i}: {' '.join(rng.sample(WORDS, 3))}" for i in range(1, 6))
+        if "best resources to learn about" in prompt:
+            if not observed:
+                subtopic = re.search(r"learn about '(.+?)'", prompt).group(1)
+                return f"Thought: I should search.\nAction: Web Search Tool\nAction Input: {subtopic}"
+            urls = list(dict.fromkeys(re.findall(r"https://bench\.local/[\w-]+", scratchpad)))[:3]
+            return "Thought: I now know the final answer.\nFinal Answer: " + "\n".join(urls)
+        if "Retrieve" in prompt and not observed:
+            return "Thought: I should look this up.\nAction: Retrieve\nAction Input: " + " ".join(rng.sample(WORDS, 4))
+        if "Create slides for the subtopic" in prompt:
+            slides = [
+                f'{{"title": "{" ".join(rng.sample(WORDS, 4)).title()}", '
+                f'"content": "{" ".join(_sentence(rng) for _ in range(8))}", "code": ""}}'
+                for _ in range(3)
+            ]
+            return "[" + ", ".join(slides) + "]"
+        if "structured summaries" in prompt and "Begin!" not in prompt:
+            return " ".join(_sentence(rng) for _ in range(10))
+        if "teaching script" in prompt:
+            return " ".join(_sentence(rng) for _ in range(6))
+        if "Answer:" in prompt and "Action" not in prompt:
+            return " ".join(_sentence(rng) for _ in range(4))
+        return "Thought: I now know the final answer.\nFinal Answer: " + " ".join(_sentence(rng) for _ in range(6))
+
+    @staticmethod
+    def _prompt(messages):
+        return "\n".join(str(message.content) for message in messages)
+
+    def _usage(self, prompt, reply):
+        prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(reply) // 4 + 1
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = self._prompt(messages)
+        reply = self._reply(prompt)
+        usage = self._usage(prompt, reply)
+        time.sleep(self.latency + usage["completion_tokens"] / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))], llm_output={"token_usage": usage})
+
+    def _stream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        reply = self._reply(prompt)
+        usage = self._usage(prompt, reply)
+        time.sleep(self.latency)
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(usage["completion_tokens"] / self.tokens_per_second / len(words))
+            metadata = {"input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"],
+                        "total_tokens": usage["total_tokens"]} if i == len(words) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " ", usage_metadata=metadata))
+
+    async def _agenerate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = self._prompt(messages)
+        reply = self._reply(prompt)
+        usage = self._usage(prompt, reply)
+        await asyncio.sleep(self.latency + usage["completion_tokens"] / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))], llm_output={"token_usage": usage})
+
+    async def _astream(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        prompt = self._prompt(messages)
+        reply = self._reply(prompt)
+        usage = self._usage(prompt, reply)
+        await asyncio.sleep(self.latency)
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(usage["completion_tokens"] / self.tokens_per_second / len(words))
+            metadata = {"input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"],
+                        "total_tokens": usage["total_tokens"]} if i == len(words) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word + " ", usage_metadata=metadata))
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: deterministic, and similar texts get similar vectors."""
+
+    def __init__(self, dimensions=256, latency_per_text=0.0005):
+        self.dimensions = dimensions
+        self.latency_per_text = latency_per_text
+
+    def _vector(self, text):
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dimensions] += 1.0
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency_per_text * len(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class _FakeModel:
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.rows = {}
+
+    @staticmethod
+    def _unwrap(data):
+        # prisma.Json wraps values bound for Json fields.
+        return {key: getattr(value, "data", value) if type(value).__name__ == "Json" else value for key, value in data.items()}
+
+    def _matches(self, row, where):
+        return all(row.get(key) == value for key, value in (where or {}).items())
+
+    def _record(self, row, include=None):
+        record = SimpleNamespace(**row)
+        if include and include.get("slide"):
+            record.slide = [SimpleNamespace(**slide) for slide in self.db.slide.rows.values() if slide["lectureId"] == row["id"]]
+        return record
+
+    async def create(self, data):
+        row = {"id": uuid4().hex[:24], "error": None, "timings": None, **self._unwrap(data)}
+        self.rows[row["id"]] = row
+        return self._record(row)
+
+    async def create_many(self, data):
+        for item in data:
+            await self.create(item)
+        return len(data)
+
+    async def update(self, where, data):
+        row = self.rows.get(where["id"])
+        if row is None:
+            return None
+        row.update(self._unwrap(data))
+        return self._record(row)
+
+    async def update_many(self, where, data):
+        rows = [row for row in list(self.rows.values()) if self._matches(row, where)]
+        for row in rows:
+            row.update(self._unwrap(data))
+        return len(rows)
+
+    async def find_unique(self, where, include=None):
+        row = self.rows.get(where["id"])
+        return self._record(row, include) if row else None
+
+    async def find_many(self, where=None, include=None):
+        return [self._record(row, include) for row in list(self.rows.values()) if self._matches(row, where)]
+
+    async def count(self, where=None):
+        return sum(1 for row in list(self.rows.values()) if self._matches(row, where))
+
+    async def delete(self, where):
+        row = self.rows.pop(where["id"], None)
+        return self._record(row) if row else None
+
+
+class FakeDatabase:
+    """In-memory stand-in for utils.db.database, with the same run()/run_async() interface."""
+
+    def __init__(self):
+        self.client = SimpleNamespace()
+        for name in ("lecture", "slide", "user"):
+            setattr(self.client, name, _FakeModel(self.client, name))
+        self._background = BackgroundLoop("fake-prisma")
+
+    @property
+    def loop(self):
+        return self._background
+
+    def attach(self, loop):
+        self._background.attach(loop)
+
+    async def connect(self):
+        pass
+
+    async def disconnect(self):
+        pass
+
+    def run(self, query):
+        async def process():
+            return await query(self.client)
+
+        return self._background.run(process())
+
+    async def run_async(self, query):
+        async def process():
+            return await query(self.client)
+
+        return await self._background.run_async(process())
+
+    def close(self):
+        pass
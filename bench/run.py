@@ -0,0 +1,197 @@
+"""Offline end-to-end benchmark: PresentationFlow and the Flask routes against the fakes in bench.fakes.
+
+    python -m bench.run --lectures 4 --qa-requests 100 --llm-latency 0.3 --output results.json
+
+Reports per-node latency, throughput for N concurrent lectures, /qa and
+/qa/stream latency percentiles and peak RSS, and writes them as JSON so runs
+can be compared over time. Nothing leaves the machine: Groq, Serper, the web,
+the embedder and Prisma are all replaced; Chroma, the caches and the
+checkpointer run for real in a scratch directory.
+"""
+import argparse
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def summarize(values):
+    if not values:
+        return {}
+    return {"count": len(values), "mean": sum(values) / len(values), "p50": percentile(values, 50),
+            "p99": percentile(values, 99), "max": max(values)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def configure(args, workdir):
+    """Points caches, Chroma and the checkpointer at workdir and swaps every external service for a fake.
+
+    Must run before the app modules are imported, since they read their settings at import time.
+    """
+    os.environ["CACHE_DIR"] = os.path.join(workdir, "cache")
+    os.environ["CHECKPOINT_PATH"] = os.path.join(workdir, "checkpoints.sqlite3")
+    os.environ["LECTURE_WORKERS"] = str(args.lectures)
+    os.environ["LECTURE_QUEUE_SIZE"] = str(args.lectures)
+    os.environ["RESEARCH_MODE"] = args.research_mode
+
+    from bench import fakes
+    from nodes import PresentationNodes
+    from utils import embeddings, llm_pool, scarper, vectorstore
+
+    corpus = fakes.FixtureCorpus(pages=args.corpus_pages)
+    scarper.http_session = fakes.FakeHTTPSession(corpus, latency=args.fetch_latency)
+    PresentationNodes.WebSearchTool = lambda: fakes.FakeSearchTool(corpus=corpus, latency=args.search_latency)
+
+    embeddings._load_embeddings = functools.lru_cache(maxsize=None)(
+        lambda backend, model, runtime=None: embeddings.CachedEmbeddings(fakes.FakeEmbeddings(), model_name=f"{backend}/{model}")
+    )
+    vectorstore.PERSIST_DIRECTORY = os.path.join(workdir, "chromadb_store")
+    vectorstore.get_client.cache_clear()
+
+    pool = llm_pool.LLMPool(keys=["bench"], requests_per_minute=10 ** 6, tokens_per_minute=10 ** 9)
+    for slot in pool.slots:
+        slot.client = fakes.FakeChatModel(latency=args.llm_latency, tokens_per_second=args.tokens_per_second)
+    llm_pool._pool = pool
+
+    from routes import lecture_api
+
+    database = fakes.FakeDatabase()
+    lecture_api.database = database
+    return database
+
+
+def run_lectures(client, count, timeout):
+    started = time.perf_counter()
+    ids = []
+    for i in range(count):
+        response = client.post("/generate-lecture", json={
+            "topic": f"Benchmark topic {i}", "clerkUserId": "bench", "force_refresh": True,
+        })
+        assert response.status_code == 202, response.get_json()
+        ids.append(response.get_json()["lecture_id"])
+
+    finished = {}
+    while len(finished) < count and time.perf_counter() - started < timeout:
+        for lecture_id in ids:
+            if lecture_id in finished:
+                continue
+            status = client.get(f"/lecture-status/{lecture_id}").get_json()
+            if status["completed"] or status["error"]:
+                finished[lecture_id] = (status, time.perf_counter() - started)
+        time.sleep(0.1)
+    wall = time.perf_counter() - started
+
+    node_seconds = {}
+    for status, _ in finished.values():
+        for node, totals in ((status.get("timings") or {}).get("nodes") or {}).items():
+            if "seconds" in totals:
+                node_seconds.setdefault(node, []).append(totals["seconds"])
+
+    completed = [lecture_id for lecture_id, (status, _) in finished.items() if status["completed"]]
+    return completed, {
+        "lectures": count,
+        "completed": len(completed),
+        "failed": sorted(status["error"] for status, _ in finished.values() if status["error"]),
+        "timed_out": count - len(finished),
+        "wall_seconds": wall,
+        "lectures_per_minute": len(completed) / wall * 60 if wall else None,
+        "lecture_seconds": summarize([elapsed for _, elapsed in finished.values()]),
+        "nodes": {node: summarize(values) for node, values in node_seconds.items()},
+        "llm_calls": sum(totals.get("llm_calls", 0) for status, _ in finished.values()
+                         for totals in ((status.get("timings") or {}).get("nodes") or {}).values()),
+    }
+
+
+def run_qa(app, lecture_ids, requests, concurrency):
+    questions = ["What is the main idea of this lecture?", "Explain the second slide.", "How does training work?"]
+
+    def ask(i):
+        client = app.test_client()
+        payload = {"lecture_id": lecture_ids[i % len(lecture_ids)], "question": questions[i % len(questions)]}
+        started = time.perf_counter()
+        response = client.post("/qa", json=payload)
+        latency = time.perf_counter() - started
+        assert response.status_code == 200, response.get_json()
+
+        started = time.perf_counter()
+        first_token = None
+        with client.post("/qa/stream", json=payload, buffered=False) as stream:
+            for chunk in stream.iter_encoded():
+                if first_token is None and b"event: token" in chunk:
+                    first_token = time.perf_counter() - started
+        return latency, first_token, time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(ask, range(requests)))
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "qa_seconds": summarize([latency for latency, _, _ in results]),
+        "stream_first_token_seconds": summarize([ttft for _, ttft, _ in results if ttft is not None]),
+        "stream_total_seconds": summarize([total for _, _, total in results]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the lecture pipeline and API.")
+    parser.add_argument("--lectures", type=int, default=4, help="lectures generated concurrently")
+    parser.add_argument("--qa-requests", type=int, default=50)
+    parser.add_argument("--qa-concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds before the fake LLM's first token")
+    parser.add_argument("--tokens-per-second", type=float, default=250.0, help="fake LLM completion speed")
+    parser.add_argument("--search-latency", type=float, default=0.1)
+    parser.add_argument("--fetch-latency", type=float, default=0.05)
+    parser.add_argument("--corpus-pages", type=int, default=60)
+    parser.add_argument("--research-mode", choices=["agent", "direct"], default=os.getenv("RESEARCH_MODE", "agent"))
+    parser.add_argument("--timeout", type=float, default=1800)
+    parser.add_argument("--output", help="JSON file for the results (default: bench/results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="apollo-bench-") as workdir:
+        configure(args, workdir)
+        from app import app
+
+        client = app.test_client()
+        lecture_ids, pipeline = run_lectures(client, args.lectures, args.timeout)
+        qa = run_qa(app, lecture_ids, args.qa_requests, args.qa_concurrency) if lecture_ids and args.qa_requests else {}
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "config": vars(args),
+        "pipeline": pipeline,
+        "qa": qa,
+        # ru_maxrss is in kilobytes on Linux.
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+    output = args.output or os.path.join(os.path.dirname(__file__), "results", f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,24 @@
 from workflows.PresentationWorkflow import PresentationFlow
+from uuid import uuid4
 import json
+from utils.metrics import track_run
 
 if __name__ == "__main__":
-    app = PresentationFlow().app
-    output = app.invoke({
-        "topic": "Teach me Machine Learning",
-        "toc": [],
-        "resources": [],
-        "documents": [],
-        "vector_db": "",
-        "content": {},
-        "slides": [],
-        "lecture": [],
-        "video_paths":[]
-    })
+    flow = PresentationFlow()
+    app = flow.app
+    with track_run() as timings:
+        output = app.invoke({
+            "topic": "Teach me Machine Learning",
+            "force_refresh": False,
+            "toc": [],
+            "resources": [],
+            "sources": {},
+            "vector_db": "",
+            "content": {},
+            "slides": [],
+            "lecture": [],
+            "video_paths":[]
+        }, flow.run_config(str(uuid4())))
+    print(json.dumps(timings.as_dict(), indent=2))
     with open(f'outputs/{output['topic']}.json','w') as ofile:
         json.dump(output,ofile)
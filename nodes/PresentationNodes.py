@@ -1,29 +1,54 @@
 from typing import TypedDict, List, Dict
 from langchain.agents import initialize_agent, AgentType
-from langchain_groq import ChatGroq
 from langchain.tools import Tool
-from langchain import hub
-from langchain_ollama import OllamaEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import os
+import re
 import json
+from difflib import SequenceMatcher
 from tools.SearchTools import WebSearchTool
-from langchain.prompts import ChatPromptTemplate
+from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
 import asyncio
-from utils.scarper import scrape_multiple
-from uuid import uuid4
-from utils.heygen import generate_heygen_video
+from concurrent.futures import ThreadPoolExecutor
+from utils.scarper import scrape_stream
+from utils.dedup import ChunkDeduplicator
+from utils.heygen import generate_heygen_videos
+from utils.embeddings import get_embeddings
+from utils.llm_pool import get_llm_pool
+from utils.llm_cache import cache_for
+from utils.vectorstore import new_collection, open_collection, vector_db_exists
+from utils.topic_index import get_topic_index
+from utils.events import pipeline_events, run_id_from
+from utils.metrics import run_in_context
 
 load_dotenv()
 
+MAX_CONCURRENCY = int(os.getenv("PRESENTATION_MAX_CONCURRENCY", "5"))
+# Parallel LLM calls in SlidesMaker/LectureAgent; 1 keeps the original serial prompting.
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "4"))
+SLIDES_MAX_ATTEMPTS = int(os.getenv("SLIDES_MAX_ATTEMPTS", "3"))
+SIMILAR_TITLE_RATIO = 0.85
+# Scraped pages allowed to wait for chunking/embedding before scrapers pause.
+INGEST_MAX_PENDING_PAGES = int(os.getenv("INGEST_MAX_PENDING_PAGES", "4"))
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "6"))
+# "agent" researches each subtopic with a ReAct agent; "direct" does one MMR lookup and one summarization call per subtopic.
+RESEARCH_MODE = os.getenv("RESEARCH_MODE", "agent")
+
+# Vendored copy of hub prompt "langchain-ai/retrieval-qa-chat", so building Nodes needs no network call.
+RETRIEVAL_QA_CHAT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "Answer any use questions based solely on the context below:\n\n<context>\n{context}\n</context>"),
+    MessagesPlaceholder("chat_history", optional=True),
+    ("human", "{input}"),
+])
+
 class PresentationState(TypedDict):
     topic: str
+    force_refresh: bool
     toc: List[str]
     resources: List[str]
-    documents: str
+    sources: Dict[str, str]
     vector_db: str
     content: Dict[str, str]
     slides: List[Dict[str, str]]
@@ -33,15 +58,79 @@ class PresentationState(TypedDict):
 class WebSearchArgs(BaseModel):
     query: str = Field(description="The search query to find relevant information from the web.")
 
+def parse_slides(text: str) -> List[Dict[str, str]]:
+    """Parses the LLM's slide array, tolerating code fences; raises ValueError when unusable."""
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    try:
+        slides = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(str(e)) from e
+    if isinstance(slides, dict):
+        slides = [slides]
+    if not isinstance(slides, list) or not all(isinstance(slide, dict) and slide.get("title") for slide in slides):
+        raise ValueError("expected a JSON array of slides with titles")
+    return [{"title": str(slide["title"]), "content": str(slide.get("content", "")), "code": str(slide.get("code") or "")} for slide in slides]
+
+
+def dedupe_slides(slides: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Keeps the first slide of every group whose titles are equal or nearly equal, preserving order."""
+    kept, titles = [], []
+    for slide in slides:
+        title = " ".join(re.findall(r"[a-z0-9]+", slide["title"].lower()))
+        if any(title == seen or SequenceMatcher(None, title, seen).ratio() >= SIMILAR_TITLE_RATIO for seen in titles):
+            continue
+        kept.append(slide)
+        titles.append(title)
+    return kept
+
+
 class Nodes:
-    def __init__(self):
-        self.llm = ChatGroq(api_key=os.environ['GROQ_API_KEY_1'], model='llama-3.3-70b-versatile')
-        self.llm2 = ChatGroq(api_key=os.environ['GROQ_API_KEY_3'], model='llama-3.3-70b-versatile')
+    def __init__(self, max_concurrency=None, generation_concurrency=None, research_mode=None):
+        self.max_concurrency = max_concurrency or MAX_CONCURRENCY
+        self.generation_concurrency = generation_concurrency or GENERATION_CONCURRENCY
+        self.research_mode = research_mode or RESEARCH_MODE
+        self.llm = get_llm_pool().chat_model()
+        # Nodes whose prompts repeat across regenerations can opt into the response cache (LLM_CACHE_NODES).
+        self.subject_llm = get_llm_pool().chat_model(cache=cache_for("SubjectSpecialist"))
+        self.slides_llm = get_llm_pool().chat_model(cache=cache_for("SlidesMaker"))
+        self.lecture_llm = get_llm_pool().chat_model(cache=cache_for("LectureAgent"))
 
         self.web_search_tool = WebSearchTool()
-        self.embeddings = OllamaEmbeddings(model="nomic-embed-text")
-        self.retrieval_qa_chat_prompt = hub.pull("langchain-ai/retrieval-qa-chat")
+        self.embeddings = get_embeddings()
+        self.retrieval_qa_chat_prompt = RETRIEVAL_QA_CHAT_PROMPT
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=50)
 
+    def _map_concurrently(self, fn, items, limit=None):
+        """Runs fn over items on a bounded thread pool, returning results in input order.
+
+        Each call runs in a copy of the caller's context, so metrics keep their run and node.
+        """
+        items = list(items)
+        limit = limit or self.max_concurrency
+        if limit <= 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+        calls = [run_in_context(fn) for _ in items]
+        with ThreadPoolExecutor(max_workers=min(limit, len(items))) as executor:
+            return list(executor.map(lambda call, item: call(item), calls, items))
+
+    def RecallResearch(self, state: PresentationState) -> PresentationState:
+        """Reuses the resources and vector store of a past lecture on a near-identical topic, unless force_refresh is set."""
+        if state.get("force_refresh"):
+            return state
+        index = get_topic_index()
+        match = index.find(state["topic"])
+        # Entries can outlive their store (GC, a deleted shared-collection key); drop those and look again.
+        while match and not vector_db_exists(match["vector_db"]):
+            index.forget(match["vector_db"])
+            match = index.find(state["topic"])
+        if match:
+            print(f"Reusing research from '{match['topic']}' (similarity {match['score']:.2f})")
+            state["resources"] = match["resources"]
+            state["vector_db"] = match["vector_db"]
+        return state
+
+    def route_after_toc(self, state: PresentationState) -> str:
+        return "ResearchSpecialist" if state.get("vector_db") else "SearchResources"
 
     def SubjectSpecialist(self, state: PresentationState) -> PresentationState:
         topic = state["topic"]
@@ -50,71 +139,158 @@ class Nodes:
         Return them in the following format:
         Subtopic1\nSubtopic2\nSubtopic3\nSubtopic4\nSubtopic5
         """
-        response = self.llm.invoke(prompt)
+        response = self.subject_llm.invoke(prompt)
         state["toc"] = response.content.strip().split("\n")
         return state
 
+    def _search_subtopic(self, subtopic: str) -> List[str]:
+        print(f"Searching for resources on: {subtopic}")
+
+        tools = [self.web_search_tool]
+        react_agent = initialize_agent(
+            tools=tools,
+            llm=self.llm,
+            agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+            verbose=False,
+            handle_parsing_errors=True
+        )
+
+        agent_prompt = f"""
+        You are an intelligent research assistant looking for the best resources to learn about '{subtopic}'.
+        Your goal is to find the most relevant and high-quality sources using the web search tool.
+
+        - Start by making an initial search query related to '{subtopic}'.
+        - If the results are not satisfactory, refine your query and try again.
+        - Stop searching when you have found at most 3 high-quality sources.
+        - Only return webpage URLs (no PDFs, courses, or video tutorials).
+        - Format: url1\nurl2\nurl3...
+
+        Begin your search now.
+        """
+
+        agent_response = react_agent.run(agent_prompt)
+        return [url.strip() for url in agent_response.strip().split("\n") if url.strip()]
+
     def SearchResources(self, state: PresentationState) -> PresentationState:
-        """Searches for resources for all subtopics and collects unique URLs in a single list."""
-        url_set = set()
-
-        for subtopic in state["toc"]:
-            print(f"Searching for resources on: {subtopic}")
-
-            tools = [self.web_search_tool]
-            react_agent = initialize_agent(
-                tools=tools,
-                llm=self.llm,
-                agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-                verbose=False,
-                handle_parsing_errors=True
-            )
-
-            agent_prompt = f"""
-            You are an intelligent research assistant looking for the best resources to learn about '{subtopic}'.
-            Your goal is to find the most relevant and high-quality sources using the web search tool.
-
-            - Start by making an initial search query related to '{subtopic}'.
-            - If the results are not satisfactory, refine your query and try again.
-            - Stop searching when you have found at most 3 high-quality sources.
-            - Only return webpage URLs (no PDFs, courses, or video tutorials).
-            - Format: url1\nurl2\nurl3...
-
-            Begin your search now.
-            """
-
-            agent_response = react_agent.run(agent_prompt)
-            urls = agent_response.strip().split("\n")
-            url_set.update(urls)
-
-        state["resources"] = list(url_set)
+        """Searches for resources for all subtopics concurrently and collects unique URLs in a single list."""
+        results = self._map_concurrently(self._search_subtopic, state["toc"])
+
+        # Merge in toc order so the same agent answers always give the same list.
+        sources = {}
+        for subtopic, urls in zip(state["toc"], results):
+            for url in urls:
+                sources.setdefault(url, subtopic)
+        state["resources"] = list(sources)
+        state["sources"] = sources
         print(state["resources"])
         return state
 
-    def ScrapeContent(self,state : PresentationState) -> PresentationState:
-        urls=state['resources']
-        extracted_texts = asyncio.run(scrape_multiple(urls))
-        state["documents"] = extracted_texts
-        print("Scraping complete.")
+    async def _ingest(self, urls, sources, vector_store, dedup) -> int:
+        chunks = 0
+        async for page in scrape_stream(urls, max_pending=INGEST_MAX_PENDING_PAGES):
+            text = dedup.clean_page(page["text"])
+            if not text:
+                continue
+            metadata = {"source": page["url"], "subtopic": sources.get(page["url"], ""), "tier": page["tier"]}
+            docs = self.text_splitter.create_documents([text], metadatas=[metadata])
+            docs = [doc for doc in docs if dedup.keep(doc.page_content)]
+            if docs:
+                await asyncio.to_thread(vector_store.add_documents, docs)
+                chunks += len(docs)
+        return chunks
+
+    def IngestResources(self, state: PresentationState) -> PresentationState:
+        """Scrapes every resource and chunks/embeds each page into a new collection as soon as it arrives.
+
+        Boilerplate lines and duplicate or near-duplicate chunks are dropped before embedding.
+        """
+        vector_store = new_collection()
+        dedup = ChunkDeduplicator(max_distance=DEDUP_MAX_DISTANCE)
+        chunks = asyncio.run(self._ingest(state["resources"], state.get("sources") or {}, vector_store, dedup))
+        print(f"Ingested {chunks} chunks from {len(state['resources'])} resources. Dedup: {dedup.summary()}")
+
+        if chunks:
+            state["vector_db"] = vector_store.ref
+            get_topic_index().add(state["topic"], vector_store.ref, state["resources"])
+        else:
+            vector_store.delete()
+            state["vector_db"] = ""
         return state
 
 
-    def StoreInVectorDB(self, state: PresentationState) -> PresentationState:
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=50)
-        splitted_docs = text_splitter.create_documents([state["documents"]])
-        collection_name = str(uuid4())
-        Chroma.from_documents(persist_directory='chromadb_store',collection_name=collection_name,documents=splitted_docs, embedding=self.embeddings)
-        state['vector_db'] = collection_name
-        return state
+    def _research_subtopic(self, retrieve_info, subtopic: str) -> str:
+        print(f"Researching: {subtopic}")
+
+        retrieval_tool = Tool(
+            name=f"Retrieve",
+            func=retrieve_info,
+            description=f"Search the vector database  to find relevant information."
+        )
+
+        react_agent = initialize_agent(
+            tools=[retrieval_tool],
+            llm=self.llm,
+            agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+            verbose=False,
+            handle_parsing_errors=True
+        )
+
+        agent_prompt = f"""
+        You are an expert research assistant generating structured summaries for '{subtopic}'.
+
+        Steps:
+        - Use the retrieval tool to fetch the most relevant information from the vector database.
+        - Extract the most useful insights.
+        - Structure the information into a well-organized summary.
+        - Remove redundant, irrelevant, or poorly formatted parts.
+        - Ensure clarity and readability.
+
+        Begin now.
+        """
+
+        agent_response = react_agent.run(agent_prompt)
+        return agent_response.strip()
+
+    def _summarize_subtopic(self, subtopic: str, information: str) -> str:
+        print(f"Researching: {subtopic}")
+        prompt = f"""
+        You are an expert research assistant generating structured summaries for '{subtopic}'.
 
+        Steps:
+        - Extract the most useful insights from the information below.
+        - Structure the information into a well-organized summary.
+        - Remove redundant, irrelevant, or poorly formatted parts.
+        - Ensure clarity and readability.
+
+        Information:
+        {information}
+        """
+        return self.llm.invoke(prompt).content.strip()
+
+    def _research_direct(self, vector_store, toc: List[str]) -> List[str]:
+        """One batched embedding call for every subtopic, then an MMR lookup and a single summarization call per subtopic."""
+        vectors = vector_store.embeddings.embed_queries(toc)
+
+        def research(item):
+            subtopic, vector = item
+            docs = vector_store.max_marginal_relevance_search_by_vector(vector, k=3, lambda_mult=0.25)
+            return self._summarize_subtopic(subtopic, "\n\n".join(doc.page_content for doc in docs))
+
+        return self._map_concurrently(research, zip(toc, vectors))
 
     def ResearchSpecialist(self, state: PresentationState) -> PresentationState:
-        """Uses the single vector database instance for researching all subtopics."""
+        """Uses the single vector database instance for researching all subtopics concurrently."""
         if not state["vector_db"]:
             print("Vector database is empty. Skipping research.")
             return state
 
-        vector_Store= Chroma(persist_directory="chromadb_store",collection_name=state['vector_db'],embedding_function=self.embeddings)
+        vector_Store= open_collection(state['vector_db'])
+        toc = state["toc"]
+        if self.research_mode == "direct":
+            state["content"] = dict(zip(toc, self._research_direct(vector_Store, toc)))
+            print("Researching Complete")
+            return state
+
         retriever=vector_Store.as_retriever(search_type="mmr",search_kwargs={'k': 3, 'lambda_mult': 0.25})
 
         def retrieve_info(query: str):
@@ -122,121 +298,109 @@ class Nodes:
             docs = retriever.invoke(query)
             return "\n\n".join([doc.page_content for doc in docs])
 
-        state["content"] = {}
-
-        for subtopic in state["toc"]:
-            print(f"Researching: {subtopic}")
+        summaries = self._map_concurrently(lambda subtopic: self._research_subtopic(retrieve_info, subtopic), toc)
+        state["content"] = dict(zip(toc, summaries))
 
-            retrieval_tool = Tool(
-                name=f"Retrieve",
-                func=retrieve_info,
-                description=f"Search the vector database  to find relevant information."
-            )
+        print("Researching Complete")
+        return state
 
-            react_agent = initialize_agent(
-                tools=[retrieval_tool],
-                llm=self.llm,
-                agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-                verbose=False,
-                handle_parsing_errors=True
-            )
 
-            agent_prompt = f"""
-            You are an expert research assistant generating structured summaries for '{subtopic}'.
 
-            Steps:
-            - Use the retrieval tool to fetch the most relevant information from the vector database.
-            - Extract the most useful insights.
-            - Structure the information into a well-organized summary.
-            - Remove redundant, irrelevant, or poorly formatted parts.
-            - Ensure clarity and readability.
+    def _make_slides(self, topic: str, information: str, slides_title: List[str]) -> List[Dict[str, str]]:
+        template = '''
+            Create slides for the subtopic: {topic}. Ensure they feel like continuation of a lecture.
+            **Instructions:**
+            1. Include coding examples with explanations if required. Retain all important details.
+            2. Use JSON format: `title`, `content`, and `code` (use `""` if not applicable).
+            3. Include only relevant information. For example, if the topic is an introduction, do not add conclusions.
+            Return ONLY a valid JSON array of objects as plain text.Dont add any language indicator like json or any other extra information.
+            5- Most importantly the content of the slides should be long atleast 8 lines.
+            6- Don't repeat the same slides if the same title or any other slide with similar meaning title is already present in the list below: {slides_title}
+
+            **Topic and Information:**
+            Topic: {topic}
+            Information: {information}
+
+            **Example Output:**
+            [
+                {{
+                    "title": "Example of Integrating Factors",
+                    "content": "Consider the differential equation dy/dx + 2y = 3. We can use Integrating Factors to solve this equation.",
+                    "code": "dy/dx + 2y = 3 => \u03bc(x) = e^\u222b2dx = e^2x => d(e^2x*y)/dx = 3e^2x => e^2x*y = (3/2)e^2x + C"
+                }}
+            ]
+        '''
+        prompt = ChatPromptTemplate.from_template(template)
+        message = prompt.invoke({'topic': topic, 'information': information,'slides_title':slides_title})
+
+        for attempt in range(1, SLIDES_MAX_ATTEMPTS + 1):
+            slides_content = self.slides_llm.invoke(message).content
+            try:
+                return parse_slides(slides_content)
+            except ValueError as e:
+                print(f"Slides for '{topic}' were not valid JSON (attempt {attempt}/{SLIDES_MAX_ATTEMPTS}): {e}")
+                if self.slides_llm.cache:
+                    self.slides_llm.cache.forget(self.slides_llm, message)
+        return []
+
+    def SlidesMaker(self, state: PresentationState, config=None) -> PresentationState:
+        """Makes slides per subtopic, publishing each subtopic's slides to the run's event stream as they are made."""
+        content = state['content']
+        run_id = run_id_from(config)
 
-            Begin now.
-            """
+        def make(topic, information, slides_title):
+            topic_slides = self._make_slides(topic, information, slides_title)
+            pipeline_events.publish(run_id, "slides", subtopic=topic, slides=topic_slides)
+            return topic_slides
 
-            agent_response = react_agent.run(agent_prompt)
-            state["content"][subtopic] = agent_response.strip()
+        slides = []
+        if self.generation_concurrency <= 1:
+            # Serial mode: each prompt sees the titles made so far.
+            for key,value in content.items():
+                slides += make(key, value, [slide['title'] for slide in slides])
+        else:
+            per_topic = self._map_concurrently(lambda item: make(item[0], item[1], []), content.items(), limit=self.generation_concurrency)
+            slides = [slide for topic_slides in per_topic for slide in topic_slides]
 
-        print("Researching Complete")
+        state["slides"] = dedupe_slides(slides)
+        print("Slides Making Complete")
         return state
 
+    def _write_script(self, topic: str, slide: Dict[str, str], slide_no: int) -> str:
+        template = '''
+        Generate a short, clear teaching script based strictly on this slide from a lecture on "{topic}".
 
+        Rules:
+        - Only explain what’s on the slide; no greetings or unrelated info.
+        - Keep it brief—just enough for one slide.
+        - Maintain flow as if this follows previous slides.
+        - If code is present, explain its logic and purpose without restating it line-by-line.
 
-    def SlidesMaker(self, state: PresentationState) -> PresentationState:
-        content = state['content']
-        slides = []
-        try:
-            for key,value in content.items():
-                template = '''
-                    Create slides for the subtopic: {topic}. Ensure they feel like continuation of a lecture.
-                    **Instructions:**
-                    1. Include coding examples with explanations if required. Retain all important details.
-                    2. Use JSON format: `title`, `content`, and `code` (use `""` if not applicable).
-                    3. Include only relevant information. For example, if the topic is an introduction, do not add conclusions.
-                    Return ONLY a valid JSON array of objects as plain text.Dont add any language indicator like json or any other extra information.
-                    5- Most importantly the content of the slides should be long atleast 8 lines.
-                    6- Don't repeat the same slides if the same title or any other slide with similar meaning title is already present in the list below: {slides_title}
-
-                    **Topic and Information:**
-                    Topic: {topic}
-                    Information: {information}
-
-                    **Example Output:**
-                    [
-                        {{
-                            "title": "Example of Integrating Factors",
-                            "content": "Consider the differential equation dy/dx + 2y = 3. We can use Integrating Factors to solve this equation.",
-                            "code": "dy/dx + 2y = 3 => \u03bc(x) = e^\u222b2dx = e^2x => d(e^2x*y)/dx = 3e^2x => e^2x*y = (3/2)e^2x + C"
-                        }}
-                    ]
-                '''
-                prompt = ChatPromptTemplate.from_template(template)
-                slides_title=[slide['title'] for slide in slides]
-                message = prompt.invoke({'topic': key, 'information': value,'slides_title':slides_title})
-                slides_content = self.llm2.invoke(message).content
-                slides_json = json.loads(slides_content)
-                slides+=slides_json
-        except Exception as e:
-            print(e)
-        finally:
-            print("Slides Making Complete")
-            state["slides"] = slides
-            return state
+        Slide: {slides}
+        slide: {slide_no}
+        '''
+        prompt = ChatPromptTemplate.from_template(template)
+        message = prompt.invoke({'topic': topic, 'slides': slide,"slide_no":slide_no})
 
+        lecture_content = self.lecture_llm.invoke(message)
+        return lecture_content.content.strip()
 
-    def LectureAgent(self, state: PresentationState) -> PresentationState:
+    def LectureAgent(self, state: PresentationState, config=None) -> PresentationState:
         slides = state['slides']
         topic = state['topic']
-        for i in range(len(slides)):
-            template = '''
-            Generate a short, clear teaching script based strictly on this slide from a lecture on "{topic}".
-
-            Rules:
-            - Only explain what’s on the slide; no greetings or unrelated info.
-            - Keep it brief—just enough for one slide.
-            - Maintain flow as if this follows previous slides.
-            - If code is present, explain its logic and purpose without restating it line-by-line.
-
-            Slide: {slides}
-            slide: {slide_no}
-            '''
-            prompt = ChatPromptTemplate.from_template(template)
-            message = prompt.invoke({'topic': topic, 'slides': slides[i],"slide_no":i})
-
-            lecture_content = self.llm2.invoke(message)
-            lecture_content = lecture_content.content.strip()
-            state['lecture'].append(lecture_content)
+        run_id = run_id_from(config)
+
+        def write(i):
+            script = self._write_script(topic, slides[i], i)
+            pipeline_events.publish(run_id, "script", index=i, title=slides[i]["title"], script=script)
+            return script
+
+        state['lecture'] = self._map_concurrently(write, range(len(slides)), limit=self.generation_concurrency)
         print("Lecture Agent Complete")
         return state
 
     def HeyGenNode(self,state: PresentationState) -> PresentationState:
-        lectures = state['lecture']
-        file_paths=[]
-        for item in lectures:
-            file_path=generate_heygen_video(item)
-            file_paths.append(file_path)
-        
-        state["video_paths"]=file_paths
+        """Renders every script concurrently; video_paths stays in script order."""
+        state["video_paths"]=generate_heygen_videos(state['lecture'])
         print("Video Agent Complete")
         return state
-
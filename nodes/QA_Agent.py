@@ -1,53 +1,251 @@
-from langchain_groq import ChatGroq
 import os
 import json
-from langchain_community.vectorstores import Chroma
+import asyncio
+import hashlib
+import numpy as np
+from contextvars import ContextVar, copy_context
 from dotenv import load_dotenv
-from langchain_ollama import OllamaEmbeddings
 from langchain.agents import initialize_agent, AgentType
 from langchain.tools import Tool
+from utils.vectorstore import COLLECTION_NOT_FOUND, open_collection
+from utils.llm_pool import get_llm_pool
+from utils.llm_cache import cache_for
+from utils.cache import MemoryLRU
+from utils.embeddings import get_embeddings
+from utils.metrics import attributed_to, qa_seconds
 load_dotenv()
 
+QA_RETRIEVER_CACHE_SIZE = int(os.getenv("QA_RETRIEVER_CACHE_SIZE", "32"))
+QA_RETRIEVER_IDLE_SECONDS = float(os.getenv("QA_RETRIEVER_IDLE_SECONDS", "900"))
+QA_CONTEXT_TOP_K = int(os.getenv("QA_CONTEXT_TOP_K", "8"))
+QA_CONTEXT_TOKEN_BUDGET = int(os.getenv("QA_CONTEXT_TOKEN_BUDGET", "1500"))
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def _as_items(content):
+    if isinstance(content, str):
+        return [part for part in content.split("\n\n") if part.strip()]
+    return list(content or [])
+
+
+def lecture_segments(slides, scripts):
+    """One segment per slide and one per slide script, labelled with the slide number."""
+    segments = []
+    for i, slide in enumerate(_as_items(slides), start=1):
+        if isinstance(slide, dict):
+            slide = "\n".join(part for part in (slide.get("title"), slide.get("content"), slide.get("code")) if part)
+        segments.append(f"[Slide {i}]\n{slide}")
+    for i, script in enumerate(_as_items(scripts), start=1):
+        segments.append(f"[Script for slide {i}]\n{script}")
+    return segments
+
+
+class SegmentIndex:
+    """Embedded slide/script segments of one lecture."""
+
+    def __init__(self, segments, embeddings):
+        self.segments = segments
+        self.embeddings = embeddings
+        self.vectors = None
+        if segments:
+            vectors = np.asarray(embeddings.embed_documents(segments), dtype=np.float32)
+            self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def select(self, question, top_k=QA_CONTEXT_TOP_K, token_budget=QA_CONTEXT_TOKEN_BUDGET):
+        """The most relevant segments that fit in token_budget, returned in lecture order."""
+        if not self.segments:
+            return []
+        query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        scores = self.vectors @ (query / (np.linalg.norm(query) or 1))
+        chosen, used = {}, 0
+        for i in np.argsort(-scores)[:top_k]:
+            segment = self.segments[i]
+            cost = estimate_tokens(segment)
+            if used + cost > token_budget:
+                if chosen:
+                    continue
+                # Even the best match is over budget on its own: keep its beginning.
+                segment = segment[:token_budget * 4]
+                cost = token_budget
+            chosen[int(i)] = segment
+            used += cost
+        return [chosen[i] for i in sorted(chosen)]
+
+
+class NoPassages:
+    """Stands in for the retriever of a lecture whose vector store is missing; answers rely on its segments alone."""
+
+    def invoke(self, query):
+        return []
+
+
+# The retriever for the question being answered; lets one agent serve every collection.
+_current_retriever = ContextVar("current_retriever")
+
+
 class QAAgent:
-    def __init__(self):
-        self.llm = ChatGroq(api_key=os.environ['GROQ_API_KEY_3'], model='llama-3.3-70b-versatile')
-        self.embeddings = OllamaEmbeddings(model="nomic-embed-text")
+    """Answers questions about a lecture.
 
-    def create_QA_agent(self,collection_name,slide_content,lecture_content,question):
-        vector_Store= Chroma(persist_directory="chromadb_store",collection_name=collection_name,embedding_function=self.embeddings)
-        retriever=vector_Store.as_retriever(search_type="mmr",
-    search_kwargs={'k': 6, 'lambda_mult': 0.25})
-        
-        def retrieve_info(query: str):
-            """Retrieves relevant passages from the vector database."""
-            docs = retriever.invoke(query)
-            print(docs)
-            return "\n\n".join([doc.page_content for doc in docs])
+    answer()/stream_answer() block the calling thread; aanswer()/astream_answer()
+    await the LLM on the caller's event loop and only hand Chroma and the
+    embedder to executor (None: the loop's default executor).
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor
+        self.llm = get_llm_pool().chat_model(cache=cache_for("QA"))
+        self.retrievers = MemoryLRU(max_entries=QA_RETRIEVER_CACHE_SIZE, max_idle=QA_RETRIEVER_IDLE_SECONDS)
+        self.segment_indexes = MemoryLRU(max_entries=QA_RETRIEVER_CACHE_SIZE, max_idle=QA_RETRIEVER_IDLE_SECONDS)
 
         retrieval_tool = Tool(
             name=f"Retrieve",
-            func=retrieve_info,
+            func=self._retrieve_info,
+            coroutine=self._aretrieve_info,
             description=f"Search the vector database to find relevant information."
-        )  
-
-        react_agent = initialize_agent(
+        )
+        self.react_agent = initialize_agent(
             tools=[retrieval_tool],
             llm=self.llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            verbose=True,
+            verbose=False,
             handle_parsing_errors=True
         )
-        agent_prompt = f"""
+
+    def _retrieve_info(self, query: str):
+        """Retrieves relevant passages from the vector database."""
+        docs = _current_retriever.get().invoke(query)
+        return "\n\n".join([doc.page_content for doc in docs])
+
+    async def _aretrieve_info(self, query: str):
+        docs = await self._run_blocking(_current_retriever.get().invoke, query)
+        return "\n\n".join([doc.page_content for doc in docs])
+
+    async def _run_blocking(self, fn, *args):
+        # In a copy of the caller's context, so metrics stay attributed to QA.
+        return await asyncio.get_running_loop().run_in_executor(self.executor, copy_context().run, fn, *args)
+
+    async def _aprepare(self, collection_name, question, context_key, load_segments):
+        def prepare():
+            excerpts = self.get_segment_index(context_key, load_segments).select(question)
+            return "\n\n".join(excerpts), self.get_retriever(collection_name)
+
+        return await self._run_blocking(prepare)
+
+    def get_retriever(self, collection_name):
+        if not collection_name:
+            return NoPassages()
+        try:
+            return self.retrievers.get_or_create(
+                collection_name,
+                lambda: open_collection(collection_name).as_retriever(search_type="mmr", search_kwargs={'k': 6, 'lambda_mult': 0.25}),
+            )
+        except COLLECTION_NOT_FOUND:
+            # Not cached, so the lecture becomes searchable as soon as its collection exists.
+            return NoPassages()
+
+    def get_segment_index(self, key, load_segments):
+        return self.segment_indexes.get_or_create(key, lambda: SegmentIndex(load_segments(), get_embeddings()))
+
+    def answer(self, collection_name, question, context_key, load_segments):
+        """Answers with only the lecture segments most relevant to question, within QA_CONTEXT_TOKEN_BUDGET.
+
+        load_segments() is called once per context_key; the embedded segments are kept in an LRU.
+        """
+        with qa_seconds.time(mode="agent"), attributed_to("QA"):
+            excerpts = self.get_segment_index(context_key, load_segments).select(question)
+            token = _current_retriever.set(self.get_retriever(collection_name))
+            try:
+                return self._answer("\n\n".join(excerpts), question)
+            finally:
+                _current_retriever.reset(token)
+
+    async def aanswer(self, collection_name, question, context_key, load_segments):
+        """answer() for event loops."""
+        with qa_seconds.time(mode="agent"), attributed_to("QA"):
+            excerpts, retriever = await self._aprepare(collection_name, question, context_key, load_segments)
+            token = _current_retriever.set(retriever)
+            try:
+                result = await self.react_agent.ainvoke({"input": self._agent_prompt(excerpts, question)})
+                return result["output"].strip()
+            finally:
+                _current_retriever.reset(token)
+
+    @staticmethod
+    def client_context(slide_content, lecture_content):
+        """(context_key, load_segments) for slide/lecture content sent by the client."""
+        context_key = hashlib.sha1(json.dumps([slide_content, lecture_content], sort_keys=True, default=str).encode()).hexdigest()
+        return context_key, lambda: lecture_segments(slide_content, lecture_content)
+
+    def create_QA_agent(self,collection_name,slide_content,lecture_content,question):
+        """Answers using slide/lecture content sent by the client; it is budgeted the same way as stored lectures."""
+        return self.answer(collection_name, question, *self.client_context(slide_content, lecture_content))
+
+    def stream_answer(self, collection_name, question, context_key, load_segments):
+        """Yields the answer text as the model produces it.
+
+        Instead of the ReAct loop, the vector store is searched once for the
+        question up front, so the first token comes after a single LLM call.
+        """
+        with qa_seconds.time(mode="stream"), attributed_to("QA"):
+            yield from self._stream_answer(collection_name, question, context_key, load_segments)
+
+    def _stream_answer(self, collection_name, question, context_key, load_segments):
+        excerpts = "\n\n".join(self.get_segment_index(context_key, load_segments).select(question))
+        passages = "\n\n".join(doc.page_content for doc in self.get_retriever(collection_name).invoke(question))
+        for chunk in self.llm.stream(self._stream_prompt(excerpts, passages, question)):
+            if chunk.content:
+                yield chunk.content
+
+    async def astream_answer(self, collection_name, question, context_key, load_segments):
+        """stream_answer() for event loops."""
+        with qa_seconds.time(mode="stream"), attributed_to("QA"):
+            excerpts, retriever = await self._aprepare(collection_name, question, context_key, load_segments)
+            docs = await self._run_blocking(retriever.invoke, question)
+            prompt = self._stream_prompt(excerpts, "\n\n".join(doc.page_content for doc in docs), question)
+            async for chunk in self.llm.astream(prompt):
+                if chunk.content:
+                    yield chunk.content
+
+    @staticmethod
+    def _stream_prompt(excerpts, passages, question):
+        return f"""
             You are a helpful educational assistant tasked with answering the following question based on lecture and slide materials.
 
-            Lecture Content:
+            Relevant Lecture Excerpts:
+            \"\"\"
+            {excerpts}
+            \"\"\"
+
+            Retrieved Reference Material:
+            \"\"\"
+            {passages}
+            \"\"\"
+
+            Question:
             \"\"\"
-            {lecture_content}
+            {question}
             \"\"\"
 
-            Slide Content:
+            Always ensure your answer is grounded in the content and avoids making assumptions.
+
+            Answer:
+        """
+
+    def _answer(self, excerpts, question):
+        agent_response = self.react_agent.run(self._agent_prompt(excerpts, question))
+        return agent_response.strip()
+
+    @staticmethod
+    def _agent_prompt(excerpts, question):
+        return f"""
+            You are a helpful educational assistant tasked with answering the following question based on lecture and slide materials.
+
+            Relevant Lecture Excerpts:
             \"\"\"
-            {slide_content}
+            {excerpts}
             \"\"\"
 
             Question:
@@ -64,6 +262,3 @@ class QAAgent:
             Answer:
         """
 
-        agent_response = react_agent.run(agent_prompt)
-        return agent_response.strip()
-
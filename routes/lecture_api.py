@@ -0,0 +1,472 @@
+"""Route logic shared by the Flask blueprint (routes.lecture_routes) and the ASGI app (asgi.py).
+
+Handlers are coroutines taking the JSON body (None for GET/DELETE) and the
+path parameters. They return a JSON-able body, a (body, status) pair, an
+EventStream or a PlainText. Database and LLM calls are awaited natively;
+blocking work (Chroma, the embedder, file IO) goes to a bounded thread pool.
+"""
+import asyncio
+import functools
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import datetime
+from prisma import Json
+from utils.db import database
+from utils.jobs import JobQueue, QueueFull
+from utils.events import pipeline_events
+from utils.metrics import registry, track_run
+
+logger = logging.getLogger(__name__)
+
+VIDEOS_DIR = os.path.join(os.path.dirname(__file__), "..", "lecVids")
+os.makedirs(VIDEOS_DIR, exist_ok=True)
+
+
+lecture_jobs = JobQueue(
+    max_workers=int(os.getenv("LECTURE_WORKERS", "2")),
+    max_pending=int(os.getenv("LECTURE_QUEUE_SIZE", "8")),
+    name="lecture-job",
+)
+
+# Threads for blocking calls made while handling requests (vector store, embedder, files).
+blocking_pool = ThreadPoolExecutor(max_workers=int(os.getenv("API_BLOCKING_WORKERS", "32")), thread_name_prefix="api-blocking")
+
+
+async def run_blocking(fn, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(blocking_pool, functools.partial(fn, *args, **kwargs))
+
+
+class EventStream:
+    """A handler result sent as Server-Sent Events.
+
+    events is a (blocking) iterator of event dicts; async_events, when given,
+    is an async iterator of the same events that servers on an event loop
+    should prefer.
+    """
+
+    def __init__(self, events, async_events=None):
+        self.events = events
+        self.async_events = async_events
+
+    async def __aiter__(self):
+        """async_events, or events stepped through on blocking_pool (always in one context, as a generator needs)."""
+        if self.async_events is not None:
+            async for event in self.async_events:
+                yield event
+            return
+        iterator, context, done = iter(self.events), copy_context(), object()
+        while (event := await run_blocking(context.run, next, iterator, done)) is not done:
+            yield event
+
+
+class PlainText:
+    def __init__(self, text, content_type="text/plain"):
+        self.text = text
+        self.content_type = content_type
+
+
+TOO_MANY_LECTURES = {"error": "Too many lectures are being generated, try again later"}
+
+
+def requires_body(handler):
+    """Answers 400 unless the request carried a JSON object."""
+    @functools.wraps(handler)
+    async def run(data, **path_params):
+        if not isinstance(data, dict):
+            return {"error": "Request body must be a JSON object"}, 400
+        return await handler(data, **path_params)
+
+    return run
+
+
+_qa_agent = None
+_qa_agent_lock = threading.Lock()
+
+
+# langchain and the pipeline are imported on first use so the app boots quickly.
+def create_workflow():
+    from workflows.PresentationWorkflow import get_presentation_flow
+
+    return get_presentation_flow()
+
+
+def get_qa_agent():
+    global _qa_agent
+    with _qa_agent_lock:
+        if _qa_agent is None:
+            from nodes.QA_Agent import QAAgent
+
+            _qa_agent = QAAgent(executor=blocking_pool)
+        return _qa_agent
+
+
+# Lectures with a queued or running job in this process.
+_active_lectures = set()
+_active_lectures_lock = threading.Lock()
+
+
+def _claim_lecture(lecture_id):
+    """Marks lecture_id as having a job in this process; False if it already has one."""
+    with _active_lectures_lock:
+        if lecture_id in _active_lectures:
+            return False
+        _active_lectures.add(lecture_id)
+        return True
+
+
+def _release_lecture(lecture_id):
+    with _active_lectures_lock:
+        _active_lectures.discard(lecture_id)
+
+
+def run_lecture_job(lecture_id, initial_state=None):
+    """Runs the graph for an already created Lecture row, saving progress and per-node timings as each node finishes.
+
+    With initial_state=None the run resumes from the lecture's last checkpoint.
+    Runs on a lecture_jobs worker thread.
+    """
+    try:
+        _run_lecture_job(lecture_id, initial_state)
+    finally:
+        _release_lecture(lecture_id)
+
+
+def _run_lecture_job(lecture_id, initial_state=None):
+    flow = create_workflow()
+    config = flow.run_config(lecture_id)
+    with track_run() as timings:
+        try:
+            for mode, chunk in flow.app.stream(initial_state, config, stream_mode=["updates", "debug"]):
+                if mode == "debug":
+                    if chunk["type"] == "task":
+                        pipeline_events.publish(lecture_id, "node_started", node=chunk["payload"]["name"])
+                    continue
+                data = {"timings": Json(timings.as_dict())}
+                for node, values in chunk.items():
+                    logger.info("Lecture %s: %s finished", lecture_id, node)
+                    data["progress"] = min(99, (flow.steps.index(node) + 1) * 100 // len(flow.steps))
+                    pipeline_events.publish(lecture_id, "node_finished", node=node, progress=data["progress"])
+                    # Record the collection as soon as it exists so delete/GC also cover unfinished lectures.
+                    if (values or {}).get("vector_db"):
+                        data["vector_db"] = values["vector_db"]
+                database.run(lambda db: db.lecture.update(where={"id": lecture_id}, data=data))
+
+            state = flow.app.get_state(config).values
+
+            async def save(db):
+                await db.lecture.update(where={"id": lecture_id}, data={
+                    "toc": state.get("toc", []),
+                    "lecture": state["lecture"],
+                    "vector_db": state["vector_db"],
+                    "video_paths": state.get("video_paths"),
+                    "resources": state.get("resources"),
+                    "completed": True,
+                    "progress": 100,
+                    "timings": Json(timings.as_dict()),
+                })
+                if state['slides']:
+                    await db.slide.create_many(data=[
+                        {'title':slide['title'],"lectureId":lecture_id,"content":slide['content'],"code":slide['code']}
+                        for slide in state['slides']
+                    ])
+
+            database.run(save)
+            pipeline_events.publish(lecture_id, "completed", progress=100, timings=timings.as_dict())
+            try:
+                flow.forget(lecture_id)
+            except Exception:
+                logger.exception("Lecture %s: deleting its checkpoints failed", lecture_id)
+        except Exception as e:
+            logger.exception("Lecture %s failed", lecture_id)
+            # Subscribers only stop waiting on a terminal event, so it goes out even if saving the error fails.
+            pipeline_events.publish(lecture_id, "failed", error=str(e))
+            try:
+                database.run(lambda db: db.lecture.update(where={"id": lecture_id}, data={"error": str(e), "timings": Json(timings.as_dict())}))
+            except Exception:
+                logger.exception("Lecture %s: saving the error failed", lecture_id)
+
+
+@requires_body
+async def generate_lecture(data):
+    if lecture_jobs.full():
+        return TOO_MANY_LECTURES, 429
+
+    lecture_in_db = await database.run_async(lambda db: db.lecture.create(data={
+        "topic": data["topic"],
+        "toc": [],
+        "lecture": [],
+        "vector_db": "",
+        "video_paths": [],
+        "completed": False,
+        "resources": [],
+        "created_at": datetime.now(),
+        "userId": data["clerkUserId"],
+        "progress": 0,
+    }))
+
+    initial_state = {
+        "topic": data["topic"],
+        "force_refresh": bool(data.get("force_refresh", False)),
+        "toc": [],
+        "resources": [],
+        "sources": {},
+        "vector_db": "",
+        "content": {},
+        "slides": [],
+        "lecture": [],
+        "video_paths": []
+    }
+
+    pipeline_events.reset(lecture_in_db.id)
+    pipeline_events.publish(lecture_in_db.id, "queued", progress=0)
+    _claim_lecture(lecture_in_db.id)
+    try:
+        lecture_jobs.submit(run_lecture_job, lecture_in_db.id, initial_state)
+    except QueueFull:
+        _release_lecture(lecture_in_db.id)
+        pipeline_events.publish(lecture_in_db.id, "failed", error="queue full")
+        await database.run_async(lambda db: db.lecture.delete(where={"id": lecture_in_db.id}))
+        return TOO_MANY_LECTURES, 429
+
+    return {
+        "lecture_id": lecture_in_db.id,
+        "status": "queued",
+        "progress": 0,
+        "message": "Lecture generation started"
+    }, 202
+
+
+async def resume_lecture(data, lecture_id):
+    """Resumes an unfinished lecture from its last checkpoint: one that failed, or one cut off by a restart."""
+    lecture = await database.run_async(lambda db: db.lecture.find_unique(where={"id": lecture_id}))
+
+    if not lecture:
+        return {"error": "Lecture not found"}, 404
+    if lecture.completed:
+        return {"error": "Lecture is already completed"}, 409
+    if not _claim_lecture(lecture_id):
+        return {"error": "Lecture is already being generated"}, 409
+
+    submitted = False
+    try:
+        if not await run_blocking(lambda: create_workflow().can_resume(lecture_id)):
+            return {"error": "No checkpoint to resume from"}, 409
+
+        # Clearing the error only if it is still the one read above claims the resume across
+        # processes, and a fast new failure isn't overwritten.
+        if lecture.error and not await database.run_async(lambda db: db.lecture.update_many(
+            where={"id": lecture_id, "completed": False, "error": lecture.error}, data={"error": None}
+        )):
+            return {"error": "Lecture is already being resumed"}, 409
+
+        pipeline_events.reset(lecture_id)
+        pipeline_events.publish(lecture_id, "queued", progress=lecture.progress)
+        try:
+            lecture_jobs.submit(run_lecture_job, lecture_id)
+        except QueueFull:
+            if lecture.error:
+                await database.run_async(lambda db: db.lecture.update(where={"id": lecture_id}, data={"error": lecture.error}))
+            pipeline_events.publish(lecture_id, "failed", error="queue full")
+            return TOO_MANY_LECTURES, 429
+        submitted = True
+    finally:
+        if not submitted:
+            _release_lecture(lecture_id)
+
+    return {
+        "lecture_id": lecture_id,
+        "status": "queued",
+        "progress": lecture.progress,
+        "message": "Lecture generation resumed"
+    }, 202
+
+
+async def lecture_status(data, lecture_id):
+    lecture = await database.run_async(lambda db: db.lecture.find_unique(where={"id": lecture_id},include={"slide":True}))
+
+    if not lecture:
+        return {"error": "Lecture not found"}, 404
+
+    return {
+        "lecture_id": lecture.id,
+        "completed": lecture.completed,
+        "video_paths": lecture.video_paths,
+        "slides": [{"title":slide.title,"content":slide.content,"code":slide.code} for slide in lecture.slide],
+        "lecture": lecture.lecture,
+        "progress": lecture.progress,
+        "error": lecture.error,
+        "timings": lecture.timings,
+        "topic": lecture.topic,
+        "resources": lecture.resources,
+        "vector_db": lecture.vector_db,
+    }
+
+
+async def lecture_events(data, lecture_id):
+    """Server-Sent Events for a lecture run: queued, node_started, node_finished, slides, script, then completed or failed."""
+    if pipeline_events.has_run(lecture_id):
+        return EventStream(pipeline_events.subscribe(lecture_id), pipeline_events.subscribe_async(lecture_id))
+
+    # Not run by this process (or long finished): report the stored state once.
+    lecture = await database.run_async(lambda db: db.lecture.find_unique(where={"id": lecture_id}))
+    if not lecture:
+        return {"error": "Lecture not found"}, 404
+    event = "completed" if lecture.completed else "failed" if lecture.error else "status"
+    return EventStream([{"event": event, "progress": lecture.progress, "error": lecture.error}])
+
+
+async def qa_context(data):
+    """(vector_db, context_key, load_segments) for a /qa payload, or None when its lecture does not exist."""
+    if "lecture_id" not in data:
+        agent = await run_blocking(get_qa_agent)
+        return (data.get("vector_db"), *agent.client_context(data["content"], data["lecture"]))
+
+    lecture_id = data["lecture_id"]
+    lecture = await database.run_async(lambda db: db.lecture.find_unique(where={"id": lecture_id}, include={"slide": True}))
+    if not lecture:
+        return None
+
+    from nodes.QA_Agent import lecture_segments
+
+    return (
+        lecture.vector_db,
+        # Slides and scripts only change when a lecture finishes, so the index is rebuilt at most once after that.
+        f"{lecture_id}:{lecture.completed}",
+        lambda: lecture_segments(
+            [{"title": slide.title, "content": slide.content, "code": slide.code} for slide in lecture.slide],
+            lecture.lecture,
+        ),
+    )
+
+
+@requires_body
+async def ask_question(data):
+    context = await qa_context(data)
+    if context is None:
+        return {"error": "Lecture not found"}, 404
+
+    vector_db, context_key, load_segments = context
+    agent = await run_blocking(get_qa_agent)
+    return {"answer": await agent.aanswer(vector_db, data["question"], context_key, load_segments)}
+
+
+@requires_body
+async def ask_question_stream(data):
+    """Same payload as /qa; answers as Server-Sent Events: token events, then done with the full answer."""
+    context = await qa_context(data)
+    if context is None:
+        return {"error": "Lecture not found"}, 404
+
+    vector_db, context_key, load_segments = context
+    agent = await run_blocking(get_qa_agent)
+
+    def events():
+        tokens = []
+        try:
+            for token in agent.stream_answer(vector_db, data["question"], context_key, load_segments):
+                tokens.append(token)
+                yield {"event": "token", "text": token}
+        except Exception as e:
+            logger.exception("Streaming answer failed")
+            yield {"event": "error", "error": str(e)}
+            return
+        yield {"event": "done", "answer": "".join(tokens).strip()}
+
+    async def async_events():
+        tokens = []
+        try:
+            async for token in agent.astream_answer(vector_db, data["question"], context_key, load_segments):
+                tokens.append(token)
+                yield {"event": "token", "text": token}
+        except Exception as e:
+            logger.exception("Streaming answer failed")
+            yield {"event": "error", "error": str(e)}
+            return
+        yield {"event": "done", "answer": "".join(tokens).strip()}
+
+    return EventStream(events(), async_events())
+
+
+async def get_all_lectures(data):
+    lectures = await database.run_async(lambda db: db.lecture.find_many())
+
+    return [
+        {
+            "lecture_id": lec.id,
+            "completed": lec.completed,
+            "slides": lec.slides,
+            "lecture": lec.lecture,
+            "progress": lec.progress,
+        }
+        for lec in lectures
+    ]
+
+
+def _drop_unreferenced_vector_db(vector_db):
+    from utils.vectorstore import delete_vector_db
+    from utils.topic_index import get_topic_index
+
+    delete_vector_db(vector_db)
+    get_topic_index().forget(vector_db)
+    if _qa_agent is not None:
+        _qa_agent.retrievers.discard(vector_db)
+
+
+def _remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def delete_lecture(data, lecture_id):
+    lecture = await database.run_async(lambda db: db.lecture.find_unique(where={"id": lecture_id}))
+
+    if not lecture:
+        return {"error": "Lecture not found"}, 404
+
+    await run_blocking(_remove_files, lecture.video_paths)
+    await database.run_async(lambda db: db.lecture.delete(where={"id": lecture_id}))
+    await run_blocking(lambda: create_workflow().forget(lecture_id))
+
+    if lecture.vector_db and not await database.run_async(lambda db: db.lecture.count(where={"vector_db": lecture.vector_db})):
+        await run_blocking(_drop_unreferenced_vector_db, lecture.vector_db)
+
+    return {"status": "success", "message": "Lecture deleted"}
+
+
+@requires_body
+async def register_user(data):
+    user = await database.run_async(lambda db: db.user.create(data={
+        "clerkuserId": data["clerkUserId"],
+        "name": data["name"],
+        "email": data["email"]
+    }))
+
+    return {"user_id": user.id, "status": "registered"}
+
+
+async def metrics(data):
+    return PlainText(registry.render(), "text/plain; version=0.0.4")
+
+
+async def health(data):
+    return {"status": "healthy", "version": "1.0.0"}
+
+
+# (path, methods, handler); paths use Flask's <param> syntax.
+ROUTES = [
+    ("/generate-lecture", ["POST"], generate_lecture),
+    ("/lecture/<lecture_id>/resume", ["POST"], resume_lecture),
+    ("/lecture-status/<lecture_id>", ["GET"], lecture_status),
+    ("/lecture/<lecture_id>/events", ["GET"], lecture_events),
+    ("/qa", ["POST"], ask_question),
+    ("/qa/stream", ["POST"], ask_question_stream),
+    ("/lectures", ["GET"], get_all_lectures),
+    ("/lecture/<lecture_id>", ["DELETE"], delete_lecture),
+    ("/register", ["POST"], register_user),
+    ("/metrics", ["GET"], metrics),
+    ("/health", ["GET"], health),
+]
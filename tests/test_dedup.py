@@ -0,0 +1,37 @@
+from utils.dedup import ChunkDeduplicator
+
+
+def test_lines_mentioning_boilerplate_words_survive():
+    lines = [
+        "source$.subscribe(observer)",
+        "def login(request):",
+        "Implementing login with OAuth 2.0",
+        "Subscribe to the topic before publishing, or the message is lost.",
+        "## Sign in flow",
+    ]
+    cleaned = ChunkDeduplicator().clean_page("\n".join(lines))
+    assert cleaned.splitlines() == lines
+
+
+def test_lines_made_only_of_boilerplate_phrases_are_dropped():
+    dedup = ChunkDeduplicator()
+    cleaned = dedup.clean_page("Sign in | Subscribe\nAccept all cookies.\n© All rights reserved\nBinary search halves the range.")
+    assert cleaned == "Binary search halves the range."
+    assert dedup.stats["boilerplate_lines"] == 3
+
+
+def test_lines_repeated_across_pages_are_dropped():
+    dedup = ChunkDeduplicator(repeated_line_pages=3)
+    pages = [f"Home > Docs > Guides\nPage {i} explains something different." for i in range(3)]
+    cleaned = [dedup.clean_page(page) for page in pages]
+    assert cleaned[0].startswith("Home > Docs > Guides")
+    assert cleaned[2] == "Page 2 explains something different."
+
+
+def test_near_duplicate_chunks_are_rejected():
+    dedup = ChunkDeduplicator()
+    text = "Binary search finds a target in a sorted array by repeatedly halving the interval that could contain it. " * 2
+    assert dedup.keep(text)
+    assert not dedup.keep(text.upper())
+    assert not dedup.keep(text.replace("target", "value", 1))
+    assert dedup.keep("Quicksort partitions the array around a pivot and recursively sorts both halves of it in place. " * 2)
@@ -2,11 +2,29 @@ from pydantic import BaseModel, Field
 from typing import Type
 from dotenv import load_dotenv
 from langchain_core.tools import BaseTool
+from requests.adapters import HTTPAdapter
+from utils.cache import SQLiteCache, cache_path
+from utils.metrics import record, search_seconds
 import requests
 import os
+import time
 
 load_dotenv()
 
+SERPER_URL = "https://google.serper.dev/search"
+SERPER_TIMEOUT = float(os.getenv("SERPER_TIMEOUT", "10"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", str(7 * 24 * 3600)))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "20000"))
+
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=2))
+
+search_cache = SQLiteCache(cache_path("search.sqlite3"), table="serper", ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_MAX_ENTRIES)
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
 
 class WebSearchArgs(BaseModel):
     query: str = Field(description="The search query to find relevant information from the web.")
@@ -17,13 +35,23 @@ class WebSearchTool(BaseTool):
     args_schema: Type[BaseModel] = WebSearchArgs
 
     def _run(self, query: str):
+        started = time.perf_counter()
+        key = normalize_query(query)
+        cached = search_cache.get(key)
+        if cached is not None:
+            search_seconds.observe(time.perf_counter() - started, cached="true")
+            record(searches=1, searches_cached=1)
+            return cached
+
         api_key = os.environ['SERPER_API_KEY']
-        url = "https://google.serper.dev/search"
         headers = {"X-API-KEY": api_key}
         params = {"q": query}
 
-        response = requests.get(url, headers=headers, params=params)
+        response = session.get(SERPER_URL, headers=headers, params=params, timeout=SERPER_TIMEOUT)
         search_results = response.json()
         results = [{item["link"]:item['snippet']} for item in search_results.get("organic", [])[:5]]
+        if response.status_code == 200:
+            search_cache.set(key, results)
+        search_seconds.observe(time.perf_counter() - started, cached="false")
+        record(searches=1)
         return results
-
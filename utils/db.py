@@ -0,0 +1,64 @@
+import asyncio
+import atexit
+from prisma import Prisma
+from utils.loop import BackgroundLoop
+
+
+class Database:
+    """One connected Prisma client for the whole process.
+
+    The client lives on its own background event loop (or, when serving ASGI,
+    on the server's loop), so request handlers and job threads share a single
+    connection instead of connecting per call.
+    """
+
+    def __init__(self):
+        self.client = Prisma()
+        self._background = BackgroundLoop("prisma")
+        self._connect_lock = asyncio.Lock()
+
+    async def _connected(self):
+        async with self._connect_lock:
+            if not self.client.is_connected():
+                await self.client.connect()
+        return self.client
+
+    @property
+    def loop(self):
+        """The BackgroundLoop the client lives on."""
+        return self._background
+
+    def attach(self, loop):
+        """Keeps the client on loop (the ASGI server's) instead of a private thread; call from that loop before first use."""
+        self._background.attach(loop)
+
+    async def connect(self):
+        await self._background.run_async(self._connected())
+
+    async def disconnect(self):
+        await self._background.run_async(self._disconnect())
+
+    def run(self, query):
+        """Runs query(client) on the database loop and blocks for the result."""
+        async def process():
+            return await query(await self._connected())
+
+        return self._background.run(process())
+
+    async def run_async(self, query):
+        async def process():
+            return await query(await self._connected())
+
+        return await self._background.run_async(process())
+
+    async def _disconnect(self):
+        if self.client.is_connected():
+            await self.client.disconnect()
+
+    def close(self):
+        if self.client.is_connected():
+            self._background.run(self._disconnect(), timeout=10)
+
+
+database = Database()
+atexit.register(database.close)
@@ -0,0 +1,103 @@
+import hashlib
+import re
+from collections import Counter
+
+BOILERPLATE_PHRASES = (
+    r"(we use cookies|accept (all )?cookies|cookie (policy|settings)|accept all|privacy policy|terms of (use|service)|"
+    r"all rights reserved|sign (in|up)|log ?in|subscribe|newsletter|skip to (main )?content|share this|follow us|"
+    r"advertisement)"
+)
+# Only lines made up entirely of these phrases (e.g. "Sign in | Subscribe"), so code and prose mentioning them survive.
+BOILERPLATE_LINE = re.compile(rf"\W*{BOILERPLATE_PHRASES}(\W+{BOILERPLATE_PHRASES})*\W*", re.IGNORECASE)
+SIMHASH_BITS = 64
+
+
+def _normalize(text):
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def simhash(text, shingle_size=3):
+    words = text.split()
+    shingles = [" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))]
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+class ChunkDeduplicator:
+    """Filters boilerplate lines and duplicate chunks across the pages of one ingest run.
+
+    Pages go through clean_page() to drop short boilerplate lines (lines that
+    are only cookie/nav phrases, or that repeat on at least repeated_line_pages pages);
+    chunks then go through keep(), which rejects exact duplicates (hash of the
+    normalized text) and near duplicates (SimHash within max_distance bits,
+    looked up by band so the check stays cheap).
+    """
+
+    def __init__(self, max_distance=6, min_chars=80, boilerplate_max_chars=200, repeated_line_pages=3):
+        if not 0 <= max_distance < SIMHASH_BITS:
+            raise ValueError(f"max_distance must be between 0 and {SIMHASH_BITS - 1}, got {max_distance}")
+        self.max_distance = max_distance
+        self.min_chars = min_chars
+        self.boilerplate_max_chars = boilerplate_max_chars
+        self.repeated_line_pages = repeated_line_pages
+        # max_distance + 1 disjoint bands: fingerprints at most max_distance bits apart
+        # can't differ in all of them, so they always share at least one band.
+        self.band_count = max_distance + 1
+        self.band_width = SIMHASH_BITS // self.band_count
+        self._hashes = set()
+        self._bands = [dict() for _ in range(self.band_count)]
+        self._line_pages = Counter()
+        self.stats = Counter()
+
+    def clean_page(self, text):
+        lines = [line.strip() for line in text.splitlines()]
+        page_lines = {line for line in lines if line and len(line) <= self.boilerplate_max_chars}
+        kept = []
+        for line in lines:
+            if not line:
+                continue
+            repeated = self._line_pages[line] + 1 >= self.repeated_line_pages
+            if len(line) <= self.boilerplate_max_chars and (repeated or BOILERPLATE_LINE.fullmatch(line)):
+                self.stats["boilerplate_lines"] += 1
+                continue
+            kept.append(line)
+        self._line_pages.update(page_lines)
+        return "\n".join(kept)
+
+    def _band_keys(self, fingerprint):
+        mask = (1 << self.band_width) - 1
+        return [(fingerprint >> (band * self.band_width)) & mask for band in range(self.band_count)]
+
+    def keep(self, text):
+        self.stats["chunks"] += 1
+        normalized = _normalize(text)
+        if len(normalized) < self.min_chars:
+            self.stats["too_short"] += 1
+            return False
+
+        digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+        if digest in self._hashes:
+            self.stats["exact_duplicates"] += 1
+            return False
+
+        fingerprint = simhash(normalized)
+        band_keys = self._band_keys(fingerprint)
+        for band, key in enumerate(band_keys):
+            for other in self._bands[band].get(key, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    self.stats["near_duplicates"] += 1
+                    return False
+
+        self._hashes.add(digest)
+        for band, key in enumerate(band_keys):
+            self._bands[band].setdefault(key, []).append(fingerprint)
+        self.stats["kept"] += 1
+        return True
+
+    def summary(self):
+        dropped = self.stats["too_short"] + self.stats["exact_duplicates"] + self.stats["near_duplicates"]
+        return {**self.stats, "dropped": dropped}
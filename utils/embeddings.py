@@ -0,0 +1,207 @@
+import functools
+import hashlib
+import importlib.util
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List
+from langchain_core.embeddings import Embeddings
+from utils.cache import CACHE_TOUCH_INTERVAL, cache_path
+from utils.metrics import embed_seconds, embedded_chunks, record
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "500000"))
+
+# "ollama" calls the Ollama server over HTTP; "local" runs sentence-transformers in this process.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "ollama")
+OLLAMA_EMBEDDING_MODEL = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# "torch", "onnx" or "onnx-int8" (the quantized ONNX export shipped with sentence-transformers models).
+LOCAL_EMBEDDING_RUNTIME = os.getenv("LOCAL_EMBEDDING_RUNTIME", "torch")
+LOCAL_EMBEDDING_ONNX_INT8_FILE = os.getenv("LOCAL_EMBEDDING_ONNX_INT8_FILE", "onnx/model_qint8_avx512_vnni.onnx")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "128"))
+LOCAL_EMBEDDING_RUNTIMES = ("torch", "onnx", "onnx-int8")
+
+if LOCAL_EMBEDDING_RUNTIME not in LOCAL_EMBEDDING_RUNTIMES:
+    raise ValueError(f"LOCAL_EMBEDDING_RUNTIME must be one of {', '.join(LOCAL_EMBEDDING_RUNTIMES)}, not {LOCAL_EMBEDDING_RUNTIME!r}")
+if EMBEDDING_BACKEND == "local" and LOCAL_EMBEDDING_RUNTIME != "torch" and not (
+    importlib.util.find_spec("optimum") and importlib.util.find_spec("onnxruntime")
+):
+    raise ImportError(f"LOCAL_EMBEDDING_RUNTIME={LOCAL_EMBEDDING_RUNTIME} needs optimum[onnxruntime]: pip install 'optimum[onnxruntime]'")
+
+
+def chunk_key(model_name, text, kind="document"):
+    return hashlib.sha256(f"{model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Content-addressed float32 vectors in SQLite, keyed by chunk_key()."""
+
+    def __init__(self, path, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed_at ON embeddings (accessed_at)")
+        self._conn.commit()
+
+    def get_many(self, keys):
+        found = {}
+        stale = []
+        now = time.time()
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, vector, accessed_at FROM embeddings WHERE key IN ({placeholders})", batch)
+                for key, blob, accessed_at in rows:
+                    found[key] = array("f", blob).tolist()
+                    if now - accessed_at > CACHE_TOUCH_INTERVAL:
+                        stale.append(key)
+            if stale:
+                self._conn.executemany("UPDATE embeddings SET accessed_at = ? WHERE key = ?", [(now, key) for key in stale])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+        return found
+
+    def set_many(self, items):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, accessed_at) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items],
+            )
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    "SELECT key FROM embeddings ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            self._conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache(cache_path("embeddings.sqlite3"))
+        return _embedding_cache
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps an embeddings model so only chunks never seen before (for this model) are embedded, in batches."""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache = None, batch_size: int = EMBEDDING_BATCH_SIZE):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache or get_embedding_cache()
+        self.batch_size = batch_size
+
+    def _embed(self, texts: List[str], kind: str, embed_batch) -> List[List[float]]:
+        started = time.perf_counter()
+        keys = [chunk_key(self.model_name, text, kind) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            batch_vectors = embed_batch([missing[key] for key in batch_keys])
+            self.cache.set_many(zip(batch_keys, batch_vectors))
+            vectors.update(zip(batch_keys, batch_vectors))
+
+        embed_seconds.observe(time.perf_counter() - started, kind=kind)
+        embedded_chunks.inc(len(missing_keys), cached="false")
+        embedded_chunks.inc(len(keys) - len(missing_keys), cached="true")
+        record(chunks_embedded=len(missing_keys), chunks_cached=len(keys) - len(missing_keys))
+        return [vectors[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts, "document", self.embeddings.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query", lambda batch: [self.embeddings.embed_query(batch[0])])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Query vectors for many texts in batched model calls.
+
+        Both backends embed queries and documents the same way, so these match embed_query() and share its cache entries.
+        """
+        return self._embed(texts, "query", self.embeddings.embed_documents)
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """In-process CPU embeddings, so neither ingestion nor /qa retrieval needs a network hop."""
+
+    def __init__(self, model_name: str, runtime: str = LOCAL_EMBEDDING_RUNTIME, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE):
+        from sentence_transformers import SentenceTransformer
+
+        kwargs = {}
+        if runtime in ("onnx", "onnx-int8"):
+            kwargs["backend"] = "onnx"
+        if runtime == "onnx-int8":
+            kwargs["model_kwargs"] = {"file_name": LOCAL_EMBEDDING_ONNX_INT8_FILE}
+        self.model = SentenceTransformer(model_name, device="cpu", **kwargs)
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vectors = self.model.encode(texts, batch_size=self.batch_size, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def default_embedding_spec():
+    """The (backend, model, runtime) new collections are created with; runtime is None for ollama."""
+    if EMBEDDING_BACKEND == "local":
+        return "local", LOCAL_EMBEDDING_MODEL, LOCAL_EMBEDDING_RUNTIME
+    return "ollama", OLLAMA_EMBEDDING_MODEL, None
+
+
+def get_embeddings(backend: str = None, model: str = None, runtime: str = None) -> CachedEmbeddings:
+    """Returns the process-wide (and therefore warm) embedder for a backend/model/runtime."""
+    if backend is None:
+        backend, model, runtime = default_embedding_spec()
+    if backend == "local" and runtime is None:
+        runtime = "torch"
+    return _load_embeddings(backend, model, runtime)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_embeddings(backend: str, model: str, runtime: str = None) -> CachedEmbeddings:
+    if backend == "local":
+        inner = SentenceTransformerEmbeddings(model, runtime=runtime)
+    elif backend == "ollama":
+        from langchain_ollama import OllamaEmbeddings
+
+        inner = OllamaEmbeddings(model=model)
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    # ONNX (and above all int8) vectors differ from torch ones, so they get their own cache entries.
+    suffix = f"@{runtime}" if runtime not in (None, "torch") else ""
+    return CachedEmbeddings(inner, model_name=f"{backend}/{model}{suffix}")
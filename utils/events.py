@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+TERMINAL_EVENTS = {"completed", "failed"}
+# Response headers for event streams; X-Accel-Buffering stops nginx from holding events back.
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+class _Run:
+    def __init__(self):
+        self.events = []
+        self.condition = threading.Condition()
+        self.finished = False
+
+
+class EventBus:
+    """In-process pipeline events per run id.
+
+    Subscribers get the run's history first and then live events, so a client
+    connecting late still sees what already happened. Only the most recent
+    max_runs runs are kept.
+    """
+
+    def __init__(self, max_runs=200, max_events_per_run=1000):
+        self.max_runs = max_runs
+        self.max_events_per_run = max_events_per_run
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _run(self, run_id, create=True):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is None and create:
+                run = self._runs[run_id] = _Run()
+                while len(self._runs) > self.max_runs:
+                    self._runs.popitem(last=False)
+            return run
+
+    def publish(self, run_id, event_type, **data):
+        if run_id is None:
+            return
+        run = self._run(run_id)
+        with run.condition:
+            if len(run.events) < self.max_events_per_run or event_type in TERMINAL_EVENTS:
+                run.events.append({"event": event_type, "time": time.time(), **data})
+            if event_type in TERMINAL_EVENTS:
+                run.finished = True
+            run.condition.notify_all()
+
+    def reset(self, run_id):
+        """Starts a fresh history for run_id, e.g. when a failed run is resumed."""
+        with self._lock:
+            self._runs.pop(run_id, None)
+        self._run(run_id)
+
+    def has_run(self, run_id):
+        return self._run(run_id, create=False) is not None
+
+    @staticmethod
+    def _take(run, position, wait=None):
+        with run.condition:
+            if wait and position >= len(run.events) and not run.finished:
+                run.condition.wait(wait)
+            pending = run.events[position:]
+            return pending, run.finished and position + len(pending) >= len(run.events)
+
+    def subscribe(self, run_id, heartbeat=15.0):
+        """Yields events for run_id until it completes or fails; yields None every heartbeat seconds of silence."""
+        run = self._run(run_id)
+        position = 0
+        while True:
+            pending, finished = self._take(run, position, wait=heartbeat)
+            position += len(pending)
+            if not pending and not finished:
+                yield None
+            for event in pending:
+                yield event
+            if finished:
+                return
+
+    async def subscribe_async(self, run_id, heartbeat=15.0, poll_interval=0.25):
+        """subscribe() for event loops: polls instead of blocking, so a waiting client holds no thread."""
+        run = self._run(run_id)
+        position = 0
+        quiet_since = time.monotonic()
+        while True:
+            pending, finished = self._take(run, position)
+            position += len(pending)
+            for event in pending:
+                yield event
+            if finished:
+                return
+            if pending:
+                quiet_since = time.monotonic()
+            elif time.monotonic() - quiet_since >= heartbeat:
+                quiet_since = time.monotonic()
+                yield None
+            await asyncio.sleep(poll_interval)
+
+
+def sse(event):
+    """Formats an event dict (or None for a keep-alive) as a Server-Sent Events frame."""
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+pipeline_events = EventBus()
+
+
+def run_id_from(config):
+    """The run id (LangGraph thread id) of the graph run a node was called with."""
+    return ((config or {}).get("configurable") or {}).get("thread_id")
@@ -1,27 +1,27 @@
-import requests
-import time
+import asyncio
 import os
+import random
 import re
+import time
 from datetime import datetime
+import httpx
+
+# Point at a local stub server to exercise the pipeline without the real API.
+HEYGEN_API_BASE = os.getenv("HEYGEN_API_BASE", "https://api.heygen.com")
+# Videos submitted to HeyGen but not yet downloaded.
+HEYGEN_MAX_IN_FLIGHT = int(os.getenv("HEYGEN_MAX_IN_FLIGHT", "10"))
+HEYGEN_TIMEOUT_SECONDS = float(os.getenv("HEYGEN_TIMEOUT_SECONDS", "900"))
+HEYGEN_POLL_MIN_SECONDS = float(os.getenv("HEYGEN_POLL_MIN_SECONDS", "2"))
+HEYGEN_POLL_MAX_SECONDS = 30.0
+DOWNLOAD_CHUNK_BYTES = 1 << 20
+MAX_TEXT_CHARS = 3000
 
-def generate_heygen_video(text, output_folder="lecVids", avatar_id="Daisy-inskirt-20220818", background="#008000"):
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
 
-    if len(text) > 3000:
+def _payload(text, avatar_id, background):
+    if len(text) > MAX_TEXT_CHARS:
         print(f"Warning: Text length ({len(text)}) exceeds recommended limit. Truncating.")
-        text = text[:2997] + "..."
-    
-    api_key = os.environ['HEYGEN_API_KEY']
-    
-    url = 'https://api.heygen.com/v2/video/generate'
-    
-    headers = {
-        'X-Api-Key': api_key,
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
-    }
-    
+        text = text[:MAX_TEXT_CHARS - 3] + "..."
+
     background_config = {
         "type": "color",
         "value": background
@@ -31,8 +31,8 @@ def generate_heygen_video(text, output_folder="lecVids", avatar_id="Daisy-inskir
             "type": "image",
             "value": background
         }
-    
-    payload = {
+
+    return {
         "video_inputs": [
             {
                 "character": {
@@ -54,60 +54,118 @@ def generate_heygen_video(text, output_folder="lecVids", avatar_id="Daisy-inskir
         },
         "test": False
     }
-    
-    try:
-        response = requests.post(url, headers=headers, json=payload)
+
+
+class HeyGenError(Exception):
+    pass
+
+
+class HeyGenRenderer:
+    """Renders many scripts concurrently: submits them all, polls each with growing
+    intervals, and streams every finished video to disk.
+
+    At most max_in_flight videos are between submission and download at once.
+    Failures come back as error strings in place of a path, like generate_heygen_video.
+    """
+
+    def __init__(self, output_folder="lecVids", avatar_id="Daisy-inskirt-20220818", background="#008000",
+                 max_in_flight=HEYGEN_MAX_IN_FLIGHT, timeout=HEYGEN_TIMEOUT_SECONDS, api_base=HEYGEN_API_BASE):
+        self.output_folder = output_folder
+        self.avatar_id = avatar_id
+        self.background = background
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.api_base = api_base.rstrip("/")
+        self.api_headers = {
+            'X-Api-Key': os.environ['HEYGEN_API_KEY'],
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+
+    async def render(self, texts):
+        """Returns one file path (or error message) per text, in the same order."""
+        os.makedirs(self.output_folder, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        limits = httpx.Limits(max_connections=self.max_in_flight * 2)
+        async with httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0), limits=limits) as client:
+            return await asyncio.gather(*(self._render_one(client, semaphore, text) for text in texts))
+
+    async def _render_one(self, client, semaphore, text):
+        async with semaphore:
+            try:
+                video_id = await self._submit(client, text)
+                video_url = await self._wait(client, video_id)
+                return await self._download(client, video_id, video_url)
+            except HeyGenError as e:
+                return str(e)
+            except Exception as e:
+                return f"An error occurred: {str(e)}"
+
+    async def _submit(self, client, text):
+        response = await client.post(f"{self.api_base}/v2/video/generate", headers=self.api_headers,
+                                     json=_payload(text, self.avatar_id, self.background))
         response_data = response.json()
-        
-        if response_data.get('error') is None:
-            video_id = response_data['data']['video_id']
-            print(f"Video is being processed. Video ID: {video_id}")
-            
-            status_url = f'https://api.heygen.com/v1/video_status.get?video_id={video_id}'
-            max_retries = 30
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                status_response = requests.get(status_url, headers=headers)
-                status_data = status_response.json()
-                
-                if 'data' not in status_data or 'status' not in status_data['data']:
-                    print(f"Unexpected response: {status_data}")
-                    time.sleep(10)
-                    retry_count += 1
-                    continue
-                    
-                status = status_data['data']['status']
-                
-                if status == 'completed':
-                    video_url = status_data['data']['video_url']
-                    print(f"Video processing complete. Downloading from: {video_url}")
-                    
-                    video_response = requests.get(video_url)
-                    if video_response.status_code == 200:
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-                        safe_id = re.sub(r'[^\w\s-]', '', video_id[:8])
-                        file_path = os.path.join(output_folder, f"lecture_{safe_id}_{timestamp}.mp4")
-                        
-                        with open(file_path, 'wb') as f:
-                            f.write(video_response.content)
-                        print(f"Video downloaded successfully to: {file_path}")
-                        return file_path
-                    else:
-                        return f"Failed to download video: HTTP {video_response.status_code}"
-                
-                elif status == 'failed':
-                    return "Video processing failed."
-                
-                else:
-                    print("Video is still processing. Checking again in 10 seconds...")
-                    time.sleep(10)
-                    retry_count += 1
-            
-            return "Video processing timed out after maximum retries."
-        else:
-            return f"Error: {response_data['error']['message']}"
-    
+        if response_data.get('error') is not None:
+            raise HeyGenError(f"Error: {response_data['error']['message']}")
+        video_id = response_data['data']['video_id']
+        print(f"Video is being processed. Video ID: {video_id}")
+        return video_id
+
+    async def _wait(self, client, video_id):
+        """Polls until the video is done, starting at HEYGEN_POLL_MIN_SECONDS and backing off to HEYGEN_POLL_MAX_SECONDS."""
+        deadline = time.monotonic() + self.timeout
+        delay = HEYGEN_POLL_MIN_SECONDS
+        while time.monotonic() < deadline:
+            # Jitter keeps many concurrent renders from polling in lockstep.
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+            delay = min(HEYGEN_POLL_MAX_SECONDS, delay * 1.5)
+
+            response = await client.get(f"{self.api_base}/v1/video_status.get", headers=self.api_headers,
+                                        params={"video_id": video_id})
+            status_data = response.json()
+            if 'data' not in status_data or 'status' not in status_data['data']:
+                print(f"Unexpected response: {status_data}")
+                continue
+
+            status = status_data['data']['status']
+            if status == 'completed':
+                return status_data['data']['video_url']
+            if status == 'failed':
+                raise HeyGenError("Video processing failed.")
+        raise HeyGenError("Video processing timed out.")
+
+    async def _download(self, client, video_id, video_url):
+        print(f"Video processing complete. Downloading from: {video_url}")
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_id = re.sub(r'[^\w\s-]', '', video_id[:8])
+        file_path = os.path.join(self.output_folder, f"lecture_{safe_id}_{timestamp}.mp4")
+        partial_path = file_path + ".part"
+
+        async with client.stream("GET", video_url) as video_response:
+            if video_response.status_code != 200:
+                raise HeyGenError(f"Failed to download video: HTTP {video_response.status_code}")
+            try:
+                with open(partial_path, 'wb') as f:
+                    async for chunk in video_response.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+                        f.write(chunk)
+            except BaseException:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+                raise
+        os.replace(partial_path, file_path)
+        print(f"Video downloaded successfully to: {file_path}")
+        return file_path
+
+
+def generate_heygen_videos(texts, output_folder="lecVids", avatar_id="Daisy-inskirt-20220818", background="#008000",
+                           max_in_flight=HEYGEN_MAX_IN_FLIGHT):
+    """Renders all texts concurrently from synchronous code; returns paths (or error messages) in order."""
+    renderer = HeyGenRenderer(output_folder, avatar_id, background, max_in_flight=max_in_flight)
+    return asyncio.run(renderer.render(list(texts)))
+
+
+def generate_heygen_video(text, output_folder="lecVids", avatar_id="Daisy-inskirt-20220818", background="#008000"):
+    try:
+        return generate_heygen_videos([text], output_folder, avatar_id, background)[0]
     except Exception as e:
-        return f"An error occurred: {str(e)}"
\ No newline at end of file
+        return f"An error occurred: {str(e)}"
@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """Bounded worker pool: max_workers jobs run at once and at most max_pending more wait.
+
+    submit() raises QueueFull instead of queueing without limit, so callers can
+    push back on clients.
+    """
+
+    def __init__(self, max_workers, max_pending, name="job"):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._queued = 0
+        self._closed = False
+
+    def full(self):
+        return self.queued >= self.max_workers + self.max_pending
+
+    @property
+    def queued(self):
+        with self._lock:
+            return self._queued
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise QueueFull(f"{self.max_workers + self.max_pending} jobs already queued or running")
+        with self._lock:
+            if self._closed:
+                self._slots.release()
+                raise QueueFull("shutting down")
+            self._queued += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._queued -= 1
+            self._idle.notify_all()
+        self._slots.release()
+
+    def drain(self, timeout=None):
+        """Stops accepting jobs and waits up to timeout seconds for queued and running ones; True if they all finished."""
+        with self._idle:
+            self._closed = True
+            return self._idle.wait_for(lambda: self._queued == 0, timeout)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
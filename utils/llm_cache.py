@@ -0,0 +1,62 @@
+import hashlib
+import os
+import threading
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from utils.cache import SQLiteCache, cache_path
+
+# Opt-in, per node: e.g. "SubjectSpecialist,SlidesMaker,LectureAgent,QA" or "*" for all.
+LLM_CACHE_NODES = {name.strip() for name in os.getenv("LLM_CACHE_NODES", "").split(",") if name.strip()}
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+
+
+class SQLiteLLMCache(BaseCache):
+    """langchain cache over SQLiteCache; keys hash the prompt with the model name and call parameters."""
+
+    def __init__(self, store: SQLiteCache):
+        self.store = store
+
+    @staticmethod
+    def _key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        value = self.store.get(self._key(prompt, llm_string))
+        if value is None:
+            return None
+        return [loads(generation) for generation in value]
+
+    def update(self, prompt, llm_string, return_val):
+        self.store.set(self._key(prompt, llm_string), [dumps(generation) for generation in return_val])
+
+    def forget(self, chat_model, prompt_value):
+        """Drops the cached reply chat_model gave for prompt_value, e.g. after it failed to parse."""
+        prompt = dumps(prompt_value.to_messages())
+        self.store.delete(self._key(prompt, chat_model._get_llm_string()))
+
+    def clear(self, **kwargs):
+        self.store.clear()
+
+    def stats(self):
+        return self.store.stats()
+
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    global _llm_cache
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            store = SQLiteCache(cache_path("llm.sqlite3"), table="responses", ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
+            _llm_cache = SQLiteLLMCache(store)
+        return _llm_cache
+
+
+def cache_for(name):
+    """The cache a node's chat model should use, or False when caching is off for it."""
+    if name in LLM_CACHE_NODES or "*" in LLM_CACHE_NODES:
+        return get_llm_cache()
+    return False
@@ -0,0 +1,313 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+import logging
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_groq import ChatGroq
+from utils.metrics import record_llm_call
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "12000"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "6"))
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "1.0"))
+LLM_MAX_BACKOFF_SECONDS = 30.0
+# Completion tokens reserved up front, corrected once the response reports real usage.
+EXPECTED_COMPLETION_TOKENS = 512
+
+
+def load_groq_keys():
+    """GROQ_API_KEYS (comma separated) if set, otherwise every GROQ_API_KEY_<n> in numeric order."""
+    keys = [key.strip() for key in os.getenv("GROQ_API_KEYS", "").split(",") if key.strip()]
+    if not keys:
+        numbered = sorted(
+            (int(match.group(1)), value)
+            for name, value in os.environ.items()
+            if (match := re.fullmatch(r"GROQ_API_KEY_(\d+)", name)) and value
+        )
+        keys = [value for _, value in numbered]
+    if not keys:
+        raise KeyError("No Groq keys configured; set GROQ_API_KEYS or GROQ_API_KEY_1..N")
+    return list(dict.fromkeys(keys))
+
+
+def estimate_tokens(messages) -> int:
+    return sum(len(str(message.content)) for message in messages) // 4 + 1
+
+
+class TokenBucket:
+    """Refills capacity units evenly over period seconds."""
+
+    def __init__(self, capacity, period=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.available = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        self._refill()
+        # Requests larger than the whole bucket are let through once it is full.
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.available) / self.rate)
+
+    def consume(self, amount):
+        self._refill()
+        self.available -= amount
+
+
+class _KeySlot:
+    def __init__(self, index, api_key, model, requests_per_minute, tokens_per_minute):
+        self.index = index
+        self.client = ChatGroq(api_key=api_key, model=model, max_retries=0)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+
+    def wait_time(self, tokens):
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens), self.cooldown_until - time.monotonic())
+
+
+def _is_retryable(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("RateLimitError", "APIConnectionError", "APITimeoutError", "InternalServerError")
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMPool:
+    """Spreads chat calls over several Groq keys.
+
+    Every key has its own requests- and tokens-per-minute buckets. A call goes
+    to the key that can serve it soonest (ties go to the key with the fewest
+    calls in flight). Rate-limited or failing calls back off with jitter and
+    are retried on another key.
+    """
+
+    def __init__(self, keys=None, model=GROQ_MODEL, requests_per_minute=GROQ_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=GROQ_TOKENS_PER_MINUTE, max_attempts=LLM_MAX_ATTEMPTS):
+        self.model = model
+        self.max_attempts = max_attempts
+        self.slots = [
+            _KeySlot(index, key, model, requests_per_minute, tokens_per_minute)
+            for index, key in enumerate(keys or load_groq_keys())
+        ]
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, tokens, avoid=None):
+        """Reserves capacity on the key that can serve soonest: (slot, 0), or (None, seconds to wait)."""
+        with self._lock:
+            candidates = [slot for slot in self.slots if slot is not avoid] or self.slots
+            slot = min(candidates, key=lambda slot: (slot.wait_time(tokens), slot.in_flight))
+            wait = slot.wait_time(tokens)
+            if wait > 0:
+                return None, wait
+            slot.requests.consume(1)
+            slot.tokens.consume(tokens)
+            slot.in_flight += 1
+            return slot, 0.0
+
+    def _acquire(self, tokens, avoid=None):
+        while True:
+            slot, wait = self._try_acquire(tokens, avoid)
+            if slot:
+                return slot
+            time.sleep(min(wait, 1.0))
+
+    async def _acquire_async(self, tokens, avoid=None):
+        while True:
+            slot, wait = self._try_acquire(tokens, avoid)
+            if slot:
+                return slot
+            await asyncio.sleep(min(wait, 1.0))
+
+    def _release(self, slot, reserved_tokens, used_tokens=None):
+        with self._lock:
+            slot.in_flight -= 1
+            if used_tokens is not None:
+                slot.tokens.consume(used_tokens - reserved_tokens)
+
+    def _back_off(self, slot, error, attempt):
+        delay = min(LLM_MAX_BACKOFF_SECONDS, LLM_BACKOFF_SECONDS * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+        with self._lock:
+            slot.cooldown_until = time.monotonic() + (_retry_after(error) or delay)
+        logger.warning("Groq key #%d failed (%s); retrying on another key", slot.index + 1, error)
+
+    def call(self, fn, tokens):
+        """Runs fn(client) on the best available key and returns its result, retrying across keys."""
+        reserved = tokens + EXPECTED_COMPLETION_TOKENS
+        last_slot = None
+        for attempt in range(1, self.max_attempts + 1):
+            slot = self._acquire(reserved, avoid=last_slot)
+            try:
+                result = fn(slot.client)
+            except Exception as e:
+                self._release(slot, reserved)
+                if not _is_retryable(e) or attempt == self.max_attempts:
+                    raise
+                self._back_off(slot, e, attempt)
+                last_slot = slot
+                continue
+            self._release(slot, reserved, _total_tokens(result))
+            return result
+
+    def stream(self, fn, tokens):
+        """Like call(), for fn(client) returning an iterator; yields its items as they arrive.
+
+        A failure is only retried on another key before the first item, so callers never see output twice.
+        """
+        reserved = tokens + EXPECTED_COMPLETION_TOKENS
+        last_slot = None
+        for attempt in range(1, self.max_attempts + 1):
+            slot = self._acquire(reserved, avoid=last_slot)
+            started = False
+            try:
+                for item in fn(slot.client):
+                    started = True
+                    yield item
+            except Exception as e:
+                if started or not _is_retryable(e) or attempt == self.max_attempts:
+                    raise
+                self._back_off(slot, e, attempt)
+                last_slot = slot
+                continue
+            finally:
+                # Also runs when the consumer stops early and the generator is closed.
+                self._release(slot, reserved)
+            return
+
+    async def acall(self, fn, tokens):
+        """call() for coroutines: awaits fn(client), so waiting on rate limits or the API holds no thread."""
+        reserved = tokens + EXPECTED_COMPLETION_TOKENS
+        last_slot = None
+        for attempt in range(1, self.max_attempts + 1):
+            slot = await self._acquire_async(reserved, avoid=last_slot)
+            try:
+                result = await fn(slot.client)
+            except Exception as e:
+                self._release(slot, reserved)
+                if not _is_retryable(e) or attempt == self.max_attempts:
+                    raise
+                self._back_off(slot, e, attempt)
+                last_slot = slot
+                continue
+            self._release(slot, reserved, _total_tokens(result))
+            return result
+
+    async def astream(self, fn, tokens):
+        """stream() for fn(client) returning an async iterator."""
+        reserved = tokens + EXPECTED_COMPLETION_TOKENS
+        last_slot = None
+        for attempt in range(1, self.max_attempts + 1):
+            slot = await self._acquire_async(reserved, avoid=last_slot)
+            started = False
+            try:
+                async for item in fn(slot.client):
+                    started = True
+                    yield item
+            except Exception as e:
+                if started or not _is_retryable(e) or attempt == self.max_attempts:
+                    raise
+                self._back_off(slot, e, attempt)
+                last_slot = slot
+                continue
+            finally:
+                self._release(slot, reserved)
+            return
+
+    def chat_model(self, cache=None):
+        """cache is a langchain BaseCache, or False to never cache (see utils.llm_cache.cache_for)."""
+        return PooledChatModel(pool=self, cache=cache)
+
+
+def _total_tokens(result):
+    usage = (getattr(result, "llm_output", None) or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+class PooledChatModel(BaseChatModel):
+    """Chat model that routes every call through an LLMPool; usable anywhere a ChatGroq is."""
+
+    pool: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "groq-pool"
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.pool.model}
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        started = time.perf_counter()
+        result = self.pool.call(lambda client: client._generate(messages, stop=stop, **kwargs), estimate_tokens(messages))
+        usage = (result.llm_output or {}).get("token_usage") or {}
+        record_llm_call(time.perf_counter() - started, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        return result
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        started = time.perf_counter()
+        usage = {}
+        try:
+            for chunk in self.pool.stream(lambda client: client._stream(messages, stop=stop, **kwargs), estimate_tokens(messages)):
+                usage = getattr(chunk.message, "usage_metadata", None) or usage
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        finally:
+            record_llm_call(time.perf_counter() - started, usage.get("input_tokens"), usage.get("output_tokens"), mode="stream")
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        started = time.perf_counter()
+        result = await self.pool.acall(lambda client: client._agenerate(messages, stop=stop, **kwargs), estimate_tokens(messages))
+        usage = (result.llm_output or {}).get("token_usage") or {}
+        record_llm_call(time.perf_counter() - started, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        return result
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        started = time.perf_counter()
+        usage = {}
+        try:
+            async for chunk in self.pool.astream(lambda client: client._astream(messages, stop=stop, **kwargs), estimate_tokens(messages)):
+                usage = getattr(chunk.message, "usage_metadata", None) or usage
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+        finally:
+            record_llm_call(time.perf_counter() - started, usage.get("input_tokens"), usage.get("output_tokens"), mode="stream")
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_llm_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LLMPool()
+        return _pool
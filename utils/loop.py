@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+
+class BackgroundLoop:
+    """An asyncio event loop running forever on a daemon thread.
+
+    Async resources (browsers, DB clients, HTTP clients) are bound to the loop
+    that created them, so anything that has to outlive a single asyncio.run()
+    lives on one of these and is reached through run()/run_async().
+    """
+
+    def __init__(self, name="background-loop"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def attach(self, loop):
+        """Adopts loop, already running on the calling thread (e.g. an ASGI server's), instead of starting a thread.
+
+        Must be called before anything has been scheduled on this BackgroundLoop.
+        """
+        with self._lock:
+            if self._loop is not None:
+                raise RuntimeError(f"{self.name}: already running on another loop")
+            self._loop = loop
+            self._thread = threading.current_thread()
+
+    def in_loop(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Runs coro on the background loop and blocks the calling thread for its result."""
+        if self.in_loop():
+            coro.close()
+            raise RuntimeError(f"{self.name}: run() called from inside its own loop, await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    async def run_async(self, coro):
+        """Awaits coro on the background loop from any other event loop."""
+        if self.in_loop():
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
@@ -0,0 +1,242 @@
+import bisect
+import functools
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labelnames, values):
+    if not labelnames:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines += self._samples()
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [f"{self.name}{_label_text(self.labelnames, key)} {value}" for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Gauge whose values are read from fn() at scrape time; fn returns {label values tuple: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def _samples(self):
+        try:
+            values = self.fn() if self.fn else self._values
+        except Exception:
+            values = {}
+        return [f"{self.name}{_label_text(self.labelnames, key)} {value}" for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        lines = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+node_seconds = registry.register(Histogram("apollo_node_duration_seconds", "Wall time of presentation pipeline nodes.", ["node"]))
+llm_calls = registry.register(Counter("apollo_llm_calls_total", "Chat completions sent to the LLM (cache hits excluded).", ["node", "mode"]))
+llm_tokens = registry.register(Counter("apollo_llm_tokens_total", "LLM tokens used, by kind (prompt or completion).", ["node", "kind"]))
+llm_seconds = registry.register(Histogram("apollo_llm_call_duration_seconds", "Wall time of single LLM calls.", ["node"]))
+scrape_seconds = registry.register(Histogram("apollo_scrape_duration_seconds", "Wall time to scrape one URL.", ["tier"]))
+scraped_bytes = registry.register(Counter("apollo_scraped_bytes_total", "UTF-8 bytes of page text scraped.", ["tier"]))
+search_seconds = registry.register(Histogram("apollo_search_duration_seconds", "Wall time of web search calls.", ["cached"]))
+embedded_chunks = registry.register(Counter("apollo_embedded_chunks_total", "Texts embedded, by whether the vector came from the cache.", ["cached"]))
+embed_seconds = registry.register(Histogram("apollo_embed_duration_seconds", "Wall time of embedding calls.", ["kind"]))
+qa_seconds = registry.register(Histogram("apollo_qa_duration_seconds", "Wall time to answer a /qa question.", ["mode"]))
+
+
+def _cache_hit_rates():
+    """Hit rates of the caches this process has opened; nothing is imported or created just to report on it."""
+    caches = {
+        "search": getattr(sys.modules.get("tools.SearchTools"), "search_cache", None),
+        "embeddings": getattr(sys.modules.get("utils.embeddings"), "_embedding_cache", None),
+        "llm": getattr(sys.modules.get("utils.llm_cache"), "_llm_cache", None),
+    }
+    return {(name,): cache.stats()["hit_rate"] for name, cache in caches.items() if cache is not None}
+
+
+cache_hit_rate = registry.register(Gauge("apollo_cache_hit_rate", "Hit rate of each cache since the process started.", ["cache"], fn=_cache_hit_rates))
+
+
+class RunTimings:
+    """Per-run breakdown: for each node, wall seconds plus whatever amounts were recorded while it ran."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.nodes = {}
+        self._lock = threading.Lock()
+
+    def add(self, node, **amounts):
+        with self._lock:
+            totals = self.nodes.setdefault(node or "other", {})
+            for name, amount in amounts.items():
+                totals[name] = totals.get(name, 0) + amount
+
+    def as_dict(self):
+        with self._lock:
+            return {"total_seconds": round(time.time() - self.started, 3),
+                    "nodes": {node: {name: round(value, 3) if isinstance(value, float) else value for name, value in totals.items()}
+                              for node, totals in self.nodes.items()}}
+
+
+_current_run = ContextVar("metrics_run", default=None)
+_current_node = ContextVar("metrics_node", default=None)
+
+
+def current_node():
+    return _current_node.get()
+
+
+def record(**amounts):
+    """Adds amounts (llm_calls=1, scraped_bytes=..., ...) to the current node of the current run, if any."""
+    run = _current_run.get()
+    if run is not None:
+        run.add(_current_node.get(), **amounts)
+
+
+@contextmanager
+def track_run():
+    """Collects a RunTimings for everything instrumented within the block (worker threads included, via run_in_context)."""
+    run = RunTimings()
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def attributed_to(name):
+    """Labels LLM calls and run amounts recorded in the block with name instead of the enclosing node."""
+    token = _current_node.set(name)
+    try:
+        yield
+    finally:
+        _current_node.reset(token)
+
+
+@contextmanager
+def node_scope(name):
+    """attributed_to(name), also recording the block's wall time under node_seconds and in the run breakdown."""
+    with attributed_to(name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            node_seconds.observe(elapsed, node=name)
+            record(seconds=elapsed)
+
+
+def instrument_node(name, fn):
+    """Wraps a graph node in node_scope(name); the wrapper keeps fn's signature, so LangGraph still passes config."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with node_scope(name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def record_llm_call(seconds, prompt_tokens=None, completion_tokens=None, mode="invoke"):
+    node = current_node() or "other"
+    llm_calls.inc(node=node, mode=mode)
+    llm_seconds.observe(seconds, node=node)
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, node=node, kind="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, node=node, kind="completion")
+    record(llm_calls=1, llm_seconds=seconds, prompt_tokens=prompt_tokens or 0, completion_tokens=completion_tokens or 0)
+
+
+def run_in_context(fn):
+    """fn bound to a copy of the caller's context, so metrics recorded on a worker thread land in the right run and node.
+
+    A context can only be entered by one thread at a time: make one per task.
+    """
+    context = copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
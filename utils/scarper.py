@@ -1,30 +1,287 @@
 import asyncio
+import atexit
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+from html.parser import HTMLParser
+import requests
+from requests.adapters import HTTPAdapter
 from playwright.async_api import async_playwright
+from utils.loop import BackgroundLoop
+from utils.metrics import record, scrape_seconds, scraped_bytes
 
-async def scrape_page(url):
+MAX_CONCURRENT_PAGES = int(os.getenv("SCRAPER_MAX_CONCURRENT_PAGES", "4"))
+PAGES_PER_BROWSER = int(os.getenv("SCRAPER_PAGES_PER_BROWSER", "50"))
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+
+HTTP_TIMEOUT = float(os.getenv("SCRAPER_HTTP_TIMEOUT", "15"))
+MIN_TEXT_CHARS = int(os.getenv("SCRAPER_MIN_TEXT_CHARS", "500"))
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+CHALLENGE_MARKERS = (
+    "cf-challenge", "challenge-platform", "just a moment...", "attention required!",
+    "checking your browser", "g-recaptcha", "h-captcha", "captcha-delivery",
+)
+JS_APP_MARKERS = (
+    "enable javascript", "javascript is required", "javascript is disabled",
+    'id="root"></div>', 'id="app"></div>', 'id="__next"></div>',
+)
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "head", "nav", "footer", "form", "iframe"}
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "br", "li", "ul", "ol", "tr", "table",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "header", "aside",
+}
+
+
+class _TextExtractor(HTMLParser):
+    """Approximates document.body.innerText for static HTML."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "br":
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+    def text(self):
+        lines = (re.sub(r"[ \t\r\f\v]+", " ", line).strip() for line in "".join(self.parts).split("\n"))
+        return "\n".join(line for line in lines if line)
+
+
+def html_to_text(html):
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return parser.text()
+
+
+def _needs_browser(html, text):
+    """Returns the reason a statically fetched page should be re-rendered in Chromium, or None."""
+    lowered = html.lower()
+    if any(marker in lowered for marker in CHALLENGE_MARKERS):
+        return "challenge page"
+    if len(text) < MIN_TEXT_CHARS:
+        if any(marker in lowered for marker in JS_APP_MARKERS):
+            return "javascript-rendered"
+        return "too little text"
+    return None
+
+
+def _make_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=1)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HTTP_HEADERS)
+    return session
+
+
+http_session = _make_session()
+
+
+def fetch_static(url):
+    """Plain HTTP GET plus HTML-to-text. Returns (text, reason) where reason is None when the text is usable."""
+    response = http_session.get(url, timeout=HTTP_TIMEOUT)
+    content_type = response.headers.get("Content-Type", "")
+    if response.status_code != 200:
+        return "", f"HTTP {response.status_code}"
+    if "html" not in content_type and "text/plain" not in content_type:
+        return "", f"unsupported content type {content_type or 'unknown'}"
+    if "text/plain" in content_type:
+        text = response.text.strip()
+        return text, None if text else "empty body"
+    html = response.text
+    text = html_to_text(html)
+    return text, _needs_browser(html, text)
+
+
+async def _block_heavy_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class _BrowserSlot:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages_served = 0
+        self.in_flight = 0
+        self.retired = False
+
+
+class BrowserPool:
+    """Long-lived Chromium shared by every scrape in the process.
+
+    Each page gets its own lightweight context, at most max_pages run at once,
+    and the browser is replaced after pages_per_browser pages to keep its memory
+    from creeping up, or as soon as it disconnects (crashed or killed).
+    Everything runs on a private background loop so the browser survives the
+    asyncio.run() of individual lectures.
+    """
+
+    def __init__(self, max_pages=MAX_CONCURRENT_PAGES, pages_per_browser=PAGES_PER_BROWSER):
+        self.max_pages = max_pages
+        self.pages_per_browser = pages_per_browser
+        self._background = BackgroundLoop("scraper-browser-pool")
+        self._semaphore = asyncio.Semaphore(max_pages)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._slot = None
+
+    async def _acquire_slot(self):
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            slot = self._slot
+            if slot is not None and (slot.retired or slot.pages_served >= self.pages_per_browser or not slot.browser.is_connected()):
+                slot.retired = True
+                if slot.in_flight == 0 and slot.browser.is_connected():
+                    await slot.browser.close()
+                self._slot = None
+            if self._slot is None:
+                browser = await self._playwright.chromium.launch(headless=True, args=["--ignore-certificate-errors"])
+                slot = self._slot = _BrowserSlot(browser)
+                # A crashed browser is replaced on the next acquire instead of failing every page until the recycle.
+                browser.on("disconnected", lambda _: setattr(slot, "retired", True))
+            self._slot.pages_served += 1
+            self._slot.in_flight += 1
+            return self._slot
+
+    async def _release_slot(self, slot):
+        slot.in_flight -= 1
+        if slot.retired and slot.in_flight == 0 and slot.browser.is_connected():
+            await slot.browser.close()
+
+    @asynccontextmanager
+    async def page(self):
+        async with self._semaphore:
+            slot = await self._acquire_slot()
+            context = None
+            try:
+                context = await slot.browser.new_context()
+                await context.route("**/*", _block_heavy_resources)
+                page = await context.new_page()
+                await page.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+                yield page
+            finally:
+                if context is not None:
+                    await context.close()
+                await self._release_slot(slot)
+
+    async def run(self, coro):
+        return await self._background.run_async(coro)
+
+    async def _close(self):
+        async with self._lock:
+            if self._slot is not None:
+                if self._slot.browser.is_connected():
+                    await self._slot.browser.close()
+                self._slot = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    def close(self):
+        if self._playwright is not None:
+            self._background.run(self._close(), timeout=30)
+
+
+browser_pool = BrowserPool()
+atexit.register(browser_pool.close)
+
+
+async def _scrape_page(url):
+    async with browser_pool.page() as page:
+        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+
+        if await page.query_selector("iframe[title*='challenge']"):
+            print(f"CAPTCHA detected on {url}. Skipping.")
+            return None
+
+        content = await page.evaluate("document.body.innerText")
+        return content.strip()
+
+
+async def scrape_url(url):
+    """Tiered fetch: a pooled HTTP GET first, the shared browser only when the static page isn't usable.
+
+    Returns {"url", "text", "tier"} where tier is "http", "browser", or "failed" (with empty text)
+    when neither produced content.
+    """
+    started = time.perf_counter()
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True, args=["--ignore-certificate-errors"])
-            context = await browser.new_context()
-            page = await context.new_page()
-
-            await page.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            
-            await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-            
-            if await page.query_selector("iframe[title*='challenge']"):
-                print(f"CAPTCHA detected on {url}. Skipping.")
-                return "CAPTCHA detected, skipping."
-            
-            content = await page.evaluate("document.body.innerText")
-            
-            await browser.close()
-            
-            return content.strip()
+        text, reason = await asyncio.to_thread(fetch_static, url)
     except Exception as e:
-        return f"Error scraping {url}: {e}"
+        text, reason = "", f"HTTP fetch failed ({e})"
 
-async def scrape_multiple(urls):
-    tasks = [scrape_page(url) for url in urls]
-    results = await asyncio.gather(*tasks)
-    return "\n\n".join(results)
+    if reason is None:
+        tier = "http"
+    else:
+        tier = "browser"
+        try:
+            text = await browser_pool.run(_scrape_page(url)) or ""
+        except Exception as e:
+            text, reason = "", f"{reason}; browser failed ({e})"
+        if not text:
+            tier = "failed"
+    print(f"Scraped {url} via {tier}" + (f" ({reason})" if reason else ""))
+    size = len(text.encode("utf-8"))
+    scrape_seconds.observe(time.perf_counter() - started, tier=tier)
+    scraped_bytes.inc(size, tier=tier)
+    record(pages_scraped=1, scraped_bytes=size)
+    return {"url": url, "text": text, "tier": tier}
+
+async def scrape_stream(urls, max_pending=8):
+    """Yields scrape_url() results in completion order.
+
+    At most max_pending pages are being scraped or waiting to be consumed at
+    once, which caps fetch concurrency and bounds the text held in memory. A
+    page whose scrape raises is yielded as a "failed" result.
+    """
+    queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_pending)
+
+    async def produce(url):
+        # The slot is released by the consumer once it takes the page off the queue.
+        await slots.acquire()
+        result = {"url": url, "text": "", "tier": "failed"}
+        try:
+            result = await scrape_url(url)
+        except Exception as e:
+            print(f"Scraping {url} failed ({e})")
+        finally:
+            queue.put_nowait(result)
+
+    producers = [asyncio.create_task(produce(url)) for url in urls]
+    try:
+        for _ in producers:
+            page = await queue.get()
+            slots.release()
+            yield page
+    finally:
+        for task in producers:
+            task.cancel()
+        await asyncio.gather(*producers, return_exceptions=True)
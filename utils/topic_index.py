@@ -0,0 +1,90 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from utils.cache import cache_path
+
+TOPIC_REUSE_THRESHOLD = float(os.getenv("TOPIC_REUSE_THRESHOLD", "0.9"))
+
+
+class TopicIndex:
+    """Embeddings of past lecture topics, used to find research a new lecture can reuse.
+
+    Each entry maps a topic to the resources and vector_db its pipeline run
+    produced; vectors from different embedding models are never compared.
+    """
+
+    def __init__(self, path, embeddings):
+        self.embeddings = embeddings
+        self.model_name = embeddings.model_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS topics ("
+            "vector_db TEXT PRIMARY KEY, topic TEXT NOT NULL, resources TEXT NOT NULL, "
+            "model TEXT NOT NULL, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _embed(self, topic):
+        vector = np.asarray(self.embeddings.embed_query(topic.strip().lower()), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def add(self, topic, vector_db, resources):
+        vector = self._embed(topic)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO topics (vector_db, topic, resources, model, embedding, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (vector_db, topic, json.dumps(resources), self.model_name, vector.tobytes(), time.time()),
+            )
+            self._conn.commit()
+
+    def find(self, topic, threshold=TOPIC_REUSE_THRESHOLD):
+        """Returns the most similar past entry as {"topic", "vector_db", "resources", "score"}, or None below threshold."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT vector_db, topic, resources, embedding FROM topics WHERE model = ?", (self.model_name,)
+            ).fetchall()
+        if not rows:
+            return None
+        matrix = np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows])
+        scores = matrix @ self._embed(topic)
+        best = int(np.argmax(scores))
+        if scores[best] < threshold:
+            return None
+        vector_db, past_topic, resources, _ = rows[best]
+        return {"topic": past_topic, "vector_db": vector_db, "resources": json.loads(resources), "score": float(scores[best])}
+
+    def forget(self, vector_db):
+        with self._lock:
+            self._conn.execute("DELETE FROM topics WHERE vector_db = ?", (vector_db,))
+            self._conn.commit()
+
+
+_topic_index = None
+_topic_index_lock = threading.Lock()
+
+
+def get_topic_index():
+    global _topic_index
+    with _topic_index_lock:
+        if _topic_index is None:
+            from utils.embeddings import get_embeddings
+
+            _topic_index = TopicIndex(cache_path("topics.sqlite3"), get_embeddings())
+        return _topic_index
+
+
+if __name__ == "__main__":
+    # Backfill from existing Lecture records: python -m utils.topic_index
+    from utils.db import database
+
+    index = get_topic_index()
+    lectures = database.run(lambda db: db.lecture.find_many(where={"completed": True}))
+    for lec in lectures:
+        if lec.vector_db:
+            index.add(lec.topic, lec.vector_db, lec.resources)
+    print(f"Indexed {sum(1 for lec in lectures if lec.vector_db)} lectures.")
@@ -0,0 +1,213 @@
+import argparse
+import functools
+import os
+import sqlite3
+import threading
+import time
+import chromadb
+import chromadb.errors
+from uuid import uuid4
+from langchain_community.vectorstores import Chroma
+from utils.embeddings import default_embedding_spec, get_embeddings
+
+PERSIST_DIRECTORY = "chromadb_store"
+
+# "collection" gives every lecture its own collection; "shared" keeps all lectures in
+# SHARED_COLLECTION, told apart by a lecture_key metadata filter.
+VECTOR_STORE_MODE = os.getenv("VECTOR_STORE_MODE", "collection")
+SHARED_COLLECTION = "lectures"
+# Lecture.vector_db holds either a collection name or "<collection>#<lecture_key>".
+REF_SEPARATOR = "#"
+
+# get_collection() on a missing collection raises ValueError on older chromadb releases.
+COLLECTION_NOT_FOUND = (ValueError,) + tuple(
+    error for error in (getattr(chromadb.errors, "InvalidCollectionException", None), getattr(chromadb.errors, "NotFoundError", None)) if error
+)
+
+# Collections created before the embedding spec was recorded on them.
+LEGACY_EMBEDDING_SPEC = ("ollama", "nomic-embed-text", None)
+
+
+_client_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    # Clients opened concurrently on one path race on setup and fail to find the default tenant.
+    with _client_lock:
+        return chromadb.PersistentClient(path=PERSIST_DIRECTORY)
+
+
+def parse_ref(vector_db):
+    """Splits a Lecture.vector_db value into (collection name, lecture_key or None)."""
+    collection_name, _, lecture_key = vector_db.partition(REF_SEPARATOR)
+    return collection_name, lecture_key or None
+
+
+def embedding_spec(collection_name):
+    metadata = get_client().get_collection(collection_name).metadata or {}
+    if "embedding_backend" not in metadata:
+        return LEGACY_EMBEDDING_SPEC
+    # Local collections from before the runtime was recorded were embedded with torch.
+    return metadata["embedding_backend"], metadata["embedding_model"], metadata.get("embedding_runtime")
+
+
+class LectureStore:
+    """One lecture's chunks, whether they live in their own collection or in the shared one."""
+
+    def __init__(self, ref):
+        self.ref = ref
+        self.collection_name, self.lecture_key = parse_ref(ref)
+        backend, model, runtime = embedding_spec(self.collection_name)
+        self.store = Chroma(client=get_client(), collection_name=self.collection_name, embedding_function=get_embeddings(backend, model, runtime))
+
+    @property
+    def filter(self):
+        return {"lecture_key": self.lecture_key} if self.lecture_key else None
+
+    @property
+    def embeddings(self):
+        return self.store.embeddings
+
+    def add_documents(self, documents):
+        now = time.time()
+        for doc in documents:
+            doc.metadata["created_at"] = now
+            if self.lecture_key:
+                doc.metadata["lecture_key"] = self.lecture_key
+        return self.store.add_documents(documents)
+
+    def as_retriever(self, search_type="similarity", search_kwargs=None):
+        search_kwargs = dict(search_kwargs or {})
+        if self.filter:
+            search_kwargs["filter"] = self.filter
+        return self.store.as_retriever(search_type=search_type, search_kwargs=search_kwargs)
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5):
+        return self.store.max_marginal_relevance_search_by_vector(embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=self.filter)
+
+    def delete(self):
+        delete_vector_db(self.ref)
+
+
+def new_collection():
+    """Creates storage for a new lecture, tagged with the embedder it uses, and returns its LectureStore."""
+    backend, model, runtime = default_embedding_spec()
+    metadata = {"embedding_backend": backend, "embedding_model": model, "created_at": time.time()}
+    if runtime:
+        metadata["embedding_runtime"] = runtime
+    if VECTOR_STORE_MODE == "shared":
+        # The shared collection keeps the embedder it was first created with.
+        get_client().get_or_create_collection(SHARED_COLLECTION, metadata=metadata)
+        return LectureStore(f"{SHARED_COLLECTION}{REF_SEPARATOR}{uuid4()}")
+    collection_name = str(uuid4())
+    get_client().create_collection(collection_name, metadata=metadata)
+    return LectureStore(collection_name)
+
+
+def open_collection(vector_db):
+    """Opens a lecture's store with the same embedder it was built with, so old lectures stay queryable."""
+    return LectureStore(vector_db)
+
+
+def vector_db_exists(vector_db):
+    """Whether a Lecture.vector_db ref still has its collection (and, in the shared collection, any records)."""
+    collection_name, lecture_key = parse_ref(vector_db)
+    try:
+        collection = get_client().get_collection(collection_name)
+    except COLLECTION_NOT_FOUND:
+        return False
+    return not lecture_key or bool(collection.get(where={"lecture_key": lecture_key}, limit=1, include=[])["ids"])
+
+
+def delete_vector_db(vector_db):
+    """Drops a lecture's chunks: its whole collection, or its records in the shared collection."""
+    collection_name, lecture_key = parse_ref(vector_db)
+    try:
+        if lecture_key:
+            get_client().get_collection(collection_name).delete(where={"lecture_key": lecture_key})
+        else:
+            get_client().delete_collection(collection_name)
+    except COLLECTION_NOT_FOUND:
+        pass
+
+
+def collect_garbage(live_refs, min_age_seconds=24 * 3600, dry_run=False):
+    """Removes collections and shared-collection records that no live lecture references.
+
+    Anything younger than min_age_seconds is kept, since a lecture still being
+    generated may not have saved its vector_db yet. Returns what was (or would
+    be) removed. Topic index entries for removed refs are forgotten as well.
+    """
+    live_collections, live_keys = set(), set()
+    for ref in live_refs:
+        collection_name, lecture_key = parse_ref(ref)
+        if lecture_key:
+            live_keys.add(lecture_key)
+        else:
+            live_collections.add(collection_name)
+
+    cutoff = time.time() - min_age_seconds
+    removed = {"collections": [], "lecture_keys": []}
+    client = get_client()
+    for collection in client.list_collections():
+        name = collection if isinstance(collection, str) else collection.name
+        if name == SHARED_COLLECTION:
+            continue
+        metadata = client.get_collection(name).metadata or {}
+        if name in live_collections or metadata.get("created_at", 0) > cutoff:
+            continue
+        removed["collections"].append(name)
+        if not dry_run:
+            client.delete_collection(name)
+
+    try:
+        shared = client.get_collection(SHARED_COLLECTION)
+    except COLLECTION_NOT_FOUND:
+        shared = None
+    if shared is not None:
+        orphaned = set()
+        for metadata in shared.get(include=["metadatas"])["metadatas"]:
+            key = (metadata or {}).get("lecture_key")
+            if key and key not in live_keys and metadata.get("created_at", 0) <= cutoff:
+                orphaned.add(key)
+        removed["lecture_keys"] = sorted(orphaned)
+        if not dry_run:
+            for key in orphaned:
+                shared.delete(where={"lecture_key": key})
+
+    if not dry_run:
+        from utils.topic_index import get_topic_index
+
+        index = get_topic_index()
+        for ref in removed["collections"] + [f"{SHARED_COLLECTION}{REF_SEPARATOR}{key}" for key in removed["lecture_keys"]]:
+            index.forget(ref)
+    return removed
+
+
+def vacuum():
+    """Reclaims space in Chroma's SQLite file; run while no other process has the store open."""
+    conn = sqlite3.connect(os.path.join(PERSIST_DIRECTORY, "chroma.sqlite3"))
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector store maintenance.")
+    parser.add_argument("command", choices=["gc"])
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be removed")
+    parser.add_argument("--min-age-hours", type=float, default=24.0)
+    parser.add_argument("--vacuum", action="store_true", help="compact chroma.sqlite3 afterwards")
+    args = parser.parse_args()
+
+    from utils.db import database
+
+    lectures = database.run(lambda db: db.lecture.find_many())
+    removed = collect_garbage([lec.vector_db for lec in lectures if lec.vector_db], args.min_age_hours * 3600, args.dry_run)
+    print(f"{'Would remove' if args.dry_run else 'Removed'} {len(removed['collections'])} collections "
+          f"and {len(removed['lecture_keys'])} lectures from the shared collection.")
+    if args.vacuum and not args.dry_run:
+        vacuum()
+        print("Vacuumed chroma.sqlite3.")
@@ -1,33 +1,78 @@
-
+import os
+import sqlite3
+import threading
 from langgraph.graph import StateGraph,END
+from langgraph.checkpoint.sqlite import SqliteSaver
 from nodes.PresentationNodes import PresentationState
 from nodes.PresentationNodes import Nodes
+from utils.metrics import instrument_node
+
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "checkpoints.sqlite3")
+
+
+def create_checkpointer(path=CHECKPOINT_PATH):
+    """SQLite checkpointer storing PresentationState after every node, so failed runs can resume."""
+    return SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+
 
 class PresentationFlow:
-    def __init__(self):
+    def __init__(self, max_concurrency=None, checkpointer=None):
+        """max_concurrency bounds the per-subtopic fan-out in SearchResources and ResearchSpecialist
+        (defaults to the PRESENTATION_MAX_CONCURRENCY env var)."""
         workflow = StateGraph(PresentationState)
-        nodes = Nodes()
-
-        workflow.add_node("SubjectSpecialist", nodes.SubjectSpecialist)
-        workflow.add_node("SearchResources", nodes.SearchResources)
-        workflow.add_node("ScrapeContent", nodes.ScrapeContent)
-        workflow.add_node("StoreInVectorDB", nodes.StoreInVectorDB)
-        workflow.add_node("ResearchSpecialist", nodes.ResearchSpecialist)
-        workflow.add_node("SlidesMaker", nodes.SlidesMaker)
-        workflow.add_node("LectureAgent", nodes.LectureAgent)
-        workflow.add_node("VideoMaker", nodes.HeyGenNode)
-
-        workflow.set_entry_point( "SubjectSpecialist")
-        workflow.add_edge("SubjectSpecialist", "SearchResources")
-        workflow.add_edge("SearchResources", "ScrapeContent")
-        workflow.add_edge("ScrapeContent", "StoreInVectorDB")
-        workflow.add_edge("StoreInVectorDB", "ResearchSpecialist")
+        nodes = Nodes(max_concurrency=max_concurrency)
+
+        workflow.add_node("RecallResearch", instrument_node("RecallResearch", nodes.RecallResearch))
+        workflow.add_node("SubjectSpecialist", instrument_node("SubjectSpecialist", nodes.SubjectSpecialist))
+        workflow.add_node("SearchResources", instrument_node("SearchResources", nodes.SearchResources))
+        workflow.add_node("IngestResources", instrument_node("IngestResources", nodes.IngestResources))
+        workflow.add_node("ResearchSpecialist", instrument_node("ResearchSpecialist", nodes.ResearchSpecialist))
+        workflow.add_node("SlidesMaker", instrument_node("SlidesMaker", nodes.SlidesMaker))
+        workflow.add_node("LectureAgent", instrument_node("LectureAgent", nodes.LectureAgent))
+        workflow.add_node("VideoMaker", instrument_node("VideoMaker", nodes.HeyGenNode))
+
+        workflow.set_entry_point("RecallResearch")
+        workflow.add_edge("RecallResearch", "SubjectSpecialist")
+        # Lectures that reused past research skip search and ingestion.
+        workflow.add_conditional_edges("SubjectSpecialist", nodes.route_after_toc, ["SearchResources", "ResearchSpecialist"])
+        workflow.add_edge("SearchResources", "IngestResources")
+        workflow.add_edge("IngestResources", "ResearchSpecialist")
         workflow.add_edge("ResearchSpecialist", "SlidesMaker")
         workflow.add_edge("SlidesMaker", "LectureAgent")
         # workflow.add_edge("LectureAgent", "VideoMaker")
         
         workflow.add_edge("LectureAgent", END)
 
-        self.app = workflow.compile()
+        # Nodes a run passes through, in order; used to report progress.
+        self.steps = ["RecallResearch", "SubjectSpecialist", "SearchResources", "IngestResources",
+                      "ResearchSpecialist", "SlidesMaker", "LectureAgent"]
+        self.app = workflow.compile(checkpointer=checkpointer or create_checkpointer())
+
+    @staticmethod
+    def run_config(run_id):
+        """Config for invoke/stream; runs are checkpointed under run_id (the lecture id for API runs)."""
+        return {"configurable": {"thread_id": run_id}}
+
+    def can_resume(self, run_id):
+        """True when run_id has a checkpoint with nodes still left to run."""
+        return bool(self.app.get_state(self.run_config(run_id)).next)
+
+    def forget(self, run_id):
+        """Deletes every checkpoint of run_id; done once a lecture completes or is deleted, so the file doesn't only grow."""
+        # SqliteSaver.delete_thread is not implemented in the langgraph-checkpoint-sqlite we pin.
+        with self.app.checkpointer.cursor() as cur:
+            cur.execute("DELETE FROM checkpoints WHERE thread_id = ?", (str(run_id),))
+            cur.execute("DELETE FROM writes WHERE thread_id = ?", (str(run_id),))
+
+
+_flow = None
+_flow_lock = threading.Lock()
+
 
-        
\ No newline at end of file
+def get_presentation_flow():
+    """Process-wide PresentationFlow; the graph is compiled and its clients created only once."""
+    global _flow
+    with _flow_lock:
+        if _flow is None:
+            _flow = PresentationFlow()
+        return _flow